@@ -0,0 +1,93 @@
+"""
+Measure how long a fresh worker takes to start and to serve its first request,
+with and without the warm-up that gunicorn runs before forking.
+
+    python benchmarks/startup.py --token <API token> [--path /posts/] [--runs 5]
+        [--settings project.settings_production]
+
+The requests are made as the user the token belongs to, against the configured
+database, so that they do real work: the default, /posts/, reads that user's
+feed. A run fails unless every request returns 200. Each run happens in a new
+Python process so that nothing is cached between runs.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from project.wsgi import application
+imported = time.perf_counter()
+if {warm}:
+    from project.warmup import warm_up_connections, warm_up_serializers, warm_up_urls
+    warm_up_urls()
+    warm_up_serializers()
+    warm_up_connections()
+warmed = time.perf_counter()
+from django.test import Client
+client = Client(HTTP_AUTHORIZATION="Token " + {token!r})
+def get():
+    response = client.get({path!r}, secure=True)
+    if response.status_code != 200:
+        sys.exit("GET {path} returned %d" % response.status_code)
+get()
+first = time.perf_counter()
+get()
+second = time.perf_counter()
+print(json.dumps({{
+    "import": imported - start,
+    "warm_up": warmed - imported,
+    "first_request": first - warmed,
+    "second_request": second - first,
+}}))
+"""
+
+
+def run(settings, warm, path, token):
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings}
+    child = subprocess.run(
+        [sys.executable, "-c", CHILD.format(warm=warm, path=path, token=token)],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if child.returncode:
+        sys.exit(child.stderr.strip().splitlines()[-1])
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--settings", default="project.settings_production")
+    parser.add_argument("--path", default="/posts/")
+    parser.add_argument("--token", required=True, help="API token to request with")
+    args = parser.parse_args()
+
+    print(
+        f"settings: {args.settings}, GET {args.path}, {args.runs} runs, "
+        "median milliseconds"
+    )
+    print(f"{'':>8} {'import':>8} {'warm_up':>8} {'1st req':>8} {'2nd req':>8}")
+    for warm in (False, True):
+        results = [
+            run(args.settings, warm, args.path, args.token) for _ in range(args.runs)
+        ]
+        row = [
+            statistics.median(result[key] for result in results) * 1000
+            for key in ("import", "warm_up", "first_request", "second_request")
+        ]
+        label = "warm" if warm else "cold"
+        print(f"{label:>8} " + " ".join(f"{value:8.1f}" for value in row))
+
+
+if __name__ == "__main__":
+    main()
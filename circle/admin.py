@@ -1,3 +1,212 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.contrib.auth.forms import UserChangeForm as BaseUserChangeForm
+from django.contrib.auth.forms import UserCreationForm as BaseUserCreationForm
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
 
-# Register your models here.
+from circle.models import (
+    Circle,
+    CircleInvitation,
+    CircleMembership,
+    DataExport,
+    Job,
+    Post,
+    PostArchive,
+    User,
+)
+
+# Below this many rows an exact count is cheap enough to run.
+EXACT_COUNT_LIMIT = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts an unfiltered changelist with PostgreSQL's table statistics instead of
+    `COUNT(*)`, which has to scan the whole table. The page count is then only
+    approximate, which is fine for browsing.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples FROM pg_class WHERE relname = %s",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] > EXACT_COUNT_LIMIT:
+                return int(row[0])
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Admin options for tables with millions of rows:
+
+    - no `COUNT(*)` of the whole table (see `EstimatedCountPaginator`)
+    - foreign keys are edited as raw ids, not a `<select>` of every row
+    - `search_fields` only match exact values, so every search can use an index
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+
+        query = Q()
+        for field_path in self.search_fields:
+            field = self._search_field(field_path)
+            try:
+                value = field.to_python(search_term)
+            except ValidationError:
+                # e.g. a name typed into a search on ids
+                continue
+            query |= Q(**{field_path: value})
+        if not query:
+            return queryset.none(), False
+        return queryset.filter(query), False
+
+    def _search_field(self, field_path):
+        model = self.model
+        *relations, name = field_path.split("__")
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        return model._meta.get_field(name)
+
+
+class SoftDeleteAdmin(LargeTableAdmin):
+    """
+    Deleting goes through the model's `soft_delete`, as it does in the API: the
+    row is hidden at once and a background job removes it with everything that
+    belongs to it. The confirmation page doesn't collect the related rows, as
+    none of them are deleted in the request.
+    """
+
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs)
+        model_count = {self.model._meta.verbose_name_plural: len(objs)}
+        return [str(obj) for obj in objs], model_count, set(), []
+
+    def delete_model(self, request, obj):
+        obj.soft_delete()
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset.filter(deleted_at__isnull=True):
+            obj.soft_delete()
+
+
+class UserCreationForm(BaseUserCreationForm):
+    class Meta:
+        model = User
+        fields = ["email", "name", "date_of_birth"]
+
+
+class UserChangeForm(BaseUserChangeForm):
+    class Meta:
+        model = User
+        fields = "__all__"
+
+
+@admin.register(User)
+class UserAdmin(SoftDeleteAdmin, BaseUserAdmin):
+    form = UserChangeForm
+    add_form = UserCreationForm
+    list_display = ["email", "name", "is_active", "is_staff", "date_joined"]
+    list_filter = []
+    search_fields = ["email", "id"]
+    ordering = ["-id"]
+    fieldsets = [
+        (None, {"fields": ["email", "password"]}),
+        ("Personal info", {"fields": ["name", "date_of_birth"]}),
+        (
+            "Permissions",
+            {
+                "fields": [
+                    "is_active",
+                    "is_staff",
+                    "is_superuser",
+                    "groups",
+                    "user_permissions",
+                ]
+            },
+        ),
+        ("Important dates", {"fields": ["last_login", "date_joined", "deleted_at"]}),
+    ]
+    add_fieldsets = [
+        (
+            None,
+            {
+                "classes": ["wide"],
+                "fields": ["email", "name", "date_of_birth", "password1", "password2"],
+            },
+        ),
+    ]
+    readonly_fields = ["last_login", "date_joined", "deleted_at"]
+
+
+@admin.register(Circle)
+class CircleAdmin(SoftDeleteAdmin):
+    list_display = ["id", "name", "deleted_at"]
+    search_fields = ["id"]
+    readonly_fields = ["deleted_at"]
+
+
+@admin.register(CircleMembership)
+class CircleMembershipAdmin(LargeTableAdmin):
+    list_display = ["id", "user", "circle", "role", "joined_at"]
+    list_select_related = ["user", "circle"]
+    raw_id_fields = ["user", "circle"]
+    search_fields = ["user__email", "circle__id"]
+
+
+@admin.register(CircleInvitation)
+class CircleInvitationAdmin(LargeTableAdmin):
+    list_display = ["id", "invitee", "circle", "role", "invited_at"]
+    list_select_related = ["invitee", "circle"]
+    raw_id_fields = ["invitee", "circle"]
+    search_fields = ["invitee__email", "circle__id"]
+
+
+@admin.register(Post)
+class PostAdmin(LargeTableAdmin):
+    list_display = ["id", "author", "circle", "posted_at"]
+    list_select_related = ["author", "circle"]
+    raw_id_fields = ["author", "circle"]
+    search_fields = ["id", "author__email", "circle__id"]
+    readonly_fields = ["body_html", "posted_at"]
+
+
+@admin.register(PostArchive)
+class PostArchiveAdmin(LargeTableAdmin):
+    list_display = ["id", "circle", "month", "post_count", "updated_at"]
+    list_select_related = ["circle"]
+    raw_id_fields = ["circle"]
+    search_fields = ["circle__id"]
+    readonly_fields = ["file", "post_count", "updated_at"]
+
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display = ["id", "task", "status", "attempts", "run_at", "finished_at"]
+    list_filter = ["status"]
+    search_fields = ["id"]
+    readonly_fields = ["progress", "last_error", "created_at", "finished_at"]
+
+
+@admin.register(DataExport)
+class DataExportAdmin(LargeTableAdmin):
+    list_display = ["id", "user", "status", "created_at", "finished_at"]
+    list_select_related = ["user"]
+    raw_id_fields = ["user"]
+    search_fields = ["user__email"]
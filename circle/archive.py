@@ -0,0 +1,280 @@
+"""
+Cold storage for old posts.
+
+`./manage.py archive_posts` moves posts older than `POST_HOT_DAYS` out of the
+posts table. Each circle's posts for each month go into one gzipped JSON lines
+file in the private storage (see circle/storage.py), recorded as a
+`PostArchive`. A month that is archived again gets its file rewritten with the
+old and new posts together. Archived posts no longer count as unread, so the
+unread counts of the circles concerned are recounted afterwards.
+
+Archived posts keep their images in storage and their author's id; names are
+looked up when the posts are read, so archives never hold a stale name.
+
+`history` reads a circle's posts before a given post, in `(posted_at, id)`
+order. It takes them from the posts table first and then from the archives,
+opening only as many monthly files as it needs to fill the page. Recently read
+files are kept in memory.
+"""
+import datetime
+import functools
+import gzip
+import heapq
+import itertools
+import json
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.utils.encoders import JSONEncoder
+
+from circle import unread
+from circle.models import Post, PostArchive, User
+from circle.storage import private_storage
+
+
+def hot_cutoff():
+    """Posts from before this are moved out of the posts table by `archive_posts`."""
+    return timezone.now() - datetime.timedelta(days=settings.POST_HOT_DAYS)
+
+
+def month_start(value):
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def month_bound(month):
+    return datetime.datetime.combine(month, datetime.time(), datetime.timezone.utc)
+
+
+def archive_name(circle_id, month):
+    return f"post_archive/circle_{circle_id}/{month:%Y-%m}.jsonl.gz"
+
+
+def _record(post):
+    return {
+        "id": post.pk,
+        "author": post.author_id,
+        "body": post.body,
+        "body_html": post.body_html,
+        "image": post.image.name or None,
+        "posted_at": post.posted_at,
+    }
+
+
+def _sort_key(record):
+    return (record["posted_at"], record["id"])
+
+
+@functools.lru_cache(maxsize=64)
+def _read_file(name, version):
+    # `version` changes whenever an archive is rewritten, so this never goes stale.
+    with private_storage.open(name, "rb") as file:
+        lines = gzip.decompress(file.read()).splitlines()
+    records = [json.loads(line) for line in lines]
+    for record in records:
+        record["posted_at"] = parse_datetime(record["posted_at"])
+    return tuple(records)
+
+
+def read_archive(archive):
+    """The archived posts, newest first."""
+    return _read_file(archive.file, archive.updated_at)
+
+
+def write_archive(circle_id, month, records):
+    records = sorted(records, key=_sort_key, reverse=True)
+    content = b"".join(
+        json.dumps(record, cls=JSONEncoder).encode() + b"\n" for record in records
+    )
+    return private_storage.save(
+        archive_name(circle_id, month), ContentFile(gzip.compress(content))
+    )
+
+
+def _replace_archive(circle_id, month, records, remove_posts=()):
+    """
+    Save `records` as the archive for a circle's month, replacing any earlier
+    file, and delete `remove_posts` from the posts table in the same transaction.
+    """
+    archive = PostArchive.objects.filter(circle_id=circle_id, month=month).first()
+    old_file = archive.file if archive else None
+    if not records:
+        new_file = None
+    else:
+        new_file = write_archive(circle_id, month, records)
+    with transaction.atomic():
+        if new_file is None:
+            PostArchive.objects.filter(circle_id=circle_id, month=month).delete()
+        else:
+            PostArchive.objects.update_or_create(
+                circle_id=circle_id,
+                month=month,
+                defaults={"file": new_file, "post_count": len(records)},
+            )
+        for start in range(0, len(remove_posts), settings.PURGE_BATCH_SIZE):
+            batch = remove_posts[start : start + settings.PURGE_BATCH_SIZE]
+            Post.objects.filter(pk__in=batch).delete()
+        if old_file:
+            transaction.on_commit(lambda: private_storage.delete(old_file))
+
+
+def archive_posts(before, report=None):
+    """Move every post from before `before` into the archives."""
+    months = (
+        Post.objects.filter(posted_at__lt=before)
+        .annotate(month=TruncMonth("posted_at"))
+        .values_list("circle_id", "month")
+        .distinct()
+        .order_by("month", "circle_id")
+    )
+    archived = 0
+    circle_ids = set()
+    for circle_id, month in months:
+        month = month_start(month)
+        end = month_bound(add_months(month, 1))
+        posts = list(
+            Post.objects.filter(
+                circle_id=circle_id,
+                posted_at__gte=month_bound(month),
+                posted_at__lt=min(before, end),
+            )
+        )
+        records = [_record(post) for post in posts]
+        archive = PostArchive.objects.filter(circle_id=circle_id, month=month).first()
+        if archive is not None:
+            moved = {record["id"] for record in records}
+            records += [r for r in read_archive(archive) if r["id"] not in moved]
+        moved_posts = [post.pk for post in posts]
+        _replace_archive(circle_id, month, records, remove_posts=moved_posts)
+        archived += len(posts)
+        circle_ids.add(circle_id)
+        if report:
+            report(f"circle {circle_id}, {month:%Y-%m}: archived {len(posts)} posts")
+    if circle_ids:
+        unread.recount(sorted(circle_ids))
+    return archived
+
+
+def remove_author(user_id, circle_ids):
+    """
+    Rewrite the archives of the given circles without a user's posts. Returns the
+    image files of the removed posts (in the default storage), which are left for
+    the caller to delete.
+    """
+    images = []
+    for archive in PostArchive.objects.filter(circle_id__in=circle_ids):
+        records = read_archive(archive)
+        kept = [record for record in records if record["author"] != user_id]
+        if len(kept) < len(records):
+            images += [
+                r["image"] for r in records if r["author"] == user_id and r["image"]
+            ]
+            _replace_archive(archive.circle_id, archive.month, kept)
+    return images
+
+
+def archive_files(archives):
+    """The archive files and the images of the posts in them, with their storage."""
+    files = []
+    for archive in archives:
+        files.append((private_storage, archive.file))
+        files += [
+            (default_storage, r["image"]) for r in read_archive(archive) if r["image"]
+        ]
+    return files
+
+
+def authored(user_id, after_archive=0, limit=None):
+    """
+    A user's archived posts, taken from the archives of their circles after the
+    archive with primary key `after_archive`, in archive order. Reads archives
+    until it has at least `limit` posts. Returns the posts, with each archive's
+    circle as `circle` and `circle_name`, and the last archive read.
+    """
+    archives = (
+        PostArchive.objects.filter(
+            circle__memberships__user_id=user_id, pk__gt=after_archive
+        )
+        .select_related("circle")
+        .order_by("pk")
+    )
+    records = []
+    last_archive = after_archive
+    for archive in archives:
+        records += [
+            {**r, "circle": archive.circle_id, "circle_name": archive.circle.name}
+            for r in read_archive(archive)
+            if r["author"] == user_id
+        ]
+        last_archive = archive.pk
+        if limit is not None and len(records) >= limit:
+            break
+    return records, last_archive
+
+
+def _is_before(record, before, before_id):
+    if before_id is None:
+        return record["posted_at"] < before
+    return _sort_key(record) < (before, before_id)
+
+
+def history(circle_id, before, limit, before_id=None):
+    """
+    Up to `limit` of a circle's posts from before `before` (or, with `before_id`,
+    before the post with that id and time), newest first, as dicts. Posts by
+    deleted users are left out. Returns the posts and the `(posted_at, id)` of the
+    last one for the next page, or None on the last page.
+    """
+    earlier = Q(posted_at__lt=before)
+    if before_id is not None:
+        earlier |= Q(posted_at=before, pk__lt=before_id)
+    stored = [
+        _record(post)
+        for post in Post.objects.filter(earlier, circle_id=circle_id).order_by(
+            "-posted_at", "-pk"
+        )[:limit]
+    ]
+
+    archived = []
+    archives = PostArchive.objects.filter(
+        circle_id=circle_id, month__lte=before.date()
+    ).order_by("-month")
+    for archive in archives:
+        if len(archived) >= limit:
+            break
+        archived += [
+            r for r in read_archive(archive) if _is_before(r, before, before_id)
+        ]
+
+    posts = list(
+        itertools.islice(
+            heapq.merge(stored, archived, key=_sort_key, reverse=True), limit
+        )
+    )
+    authors = dict(
+        User.objects.filter(
+            pk__in={post["author"] for post in posts}, deleted_at__isnull=True
+        ).values_list("pk", "name")
+    )
+    stored_ids = {record["id"] for record in stored}
+    results = [
+        {
+            **post,
+            "author": authors[post["author"]],
+            "archived": post["id"] not in stored_ids,
+        }
+        for post in posts
+        if post["author"] in authors
+    ]
+    next_page = _sort_key(posts[-1]) if len(posts) == limit else None
+    return results, next_page
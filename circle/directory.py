@@ -0,0 +1,85 @@
+"""
+The directory: everyone who shares at least one circle with a user, listed once
+each along with the circles they share.
+
+It is built with one query that joins `CircleMembership` to itself through the
+circle, and cached per user for `DIRECTORY_CACHE_SECONDS` in the default cache,
+which every worker shares. Whatever changes who is in a circle
+(`Circle.add_members`, `CircleInvitation.accept`, deleting a circle or a user)
+calls `invalidate_circle` or `invalidate_user`. That clears the cached directory
+of everyone affected once the change is committed. Other changes, such as
+renamed users or memberships edited in the admin, show up when the cached
+directory expires.
+"""
+import itertools
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from circle.models import CircleMembership
+
+
+def cache_key(user_id):
+    return f"directory:{user_id}"
+
+
+def build_directory(user):
+    rows = (
+        CircleMembership.objects.filter(
+            circle__memberships__user=user,
+            circle__deleted_at__isnull=True,
+            user__deleted_at__isnull=True,
+        )
+        .exclude(user=user)
+        .order_by("user__name", "user_id", "circle__name", "circle_id")
+        .values_list("user_id", "user__name", "circle_id", "circle__name")
+    )
+    directory = []
+    for (user_id, name), shared in itertools.groupby(rows, key=lambda row: row[:2]):
+        directory.append(
+            {
+                "id": user_id,
+                "name": name,
+                "circles": [
+                    {"id": circle_id, "name": circle_name}
+                    for _, _, circle_id, circle_name in shared
+                ],
+            }
+        )
+    return directory
+
+
+def get_directory(user):
+    key = cache_key(user.pk)
+    directory = cache.get(key)
+    if directory is None:
+        directory = build_directory(user)
+        cache.set(key, directory, settings.DIRECTORY_CACHE_SECONDS)
+    return directory
+
+
+def _invalidate(members):
+    # After the commit, so that no one can cache the old directory again in
+    # between.
+    transaction.on_commit(
+        lambda: cache.delete_many([cache_key(pk) for pk in set(members)])
+    )
+
+
+def invalidate_circle(circle_id):
+    """Clear the directories of everyone in a circle."""
+    _invalidate(
+        CircleMembership.objects.filter(circle_id=circle_id).values_list(
+            "user_id", flat=True
+        )
+    )
+
+
+def invalidate_user(user_id):
+    """Clear the directories of a user and everyone who shares a circle with them."""
+    _invalidate(
+        CircleMembership.objects.filter(
+            circle__memberships__user_id=user_id
+        ).values_list("user_id", flat=True)
+    )
@@ -0,0 +1,320 @@
+"""
+Push notifications for new posts and invitations.
+
+Clients open a server-sent events stream at `/events/` on the ASGI app instead of
+polling `GET /posts/` and `GET /invitations/`. The stream is authenticated with
+the same DRF token as the rest of the API, passed either in the `Authorization`
+header or as `?token=` (browsers' `EventSource` cannot set headers).
+
+Each open stream is one coroutine and one bounded queue, with no thread or
+database connection held, so a node can keep a very large number of them open.
+
+Views publish events through `get_broker()`. The default `InProcessBroker` only
+reaches clients connected to the same process, which is enough for `runserver`.
+Production runs several web processes, so it uses `PostgresBroker`, which fans
+events out to every process through PostgreSQL's NOTIFY. `EVENTS_BROKER` can
+name any class with the same `subscribe`/`unsubscribe`/`publish` methods.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import select
+import threading
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils.module_loading import import_string
+from rest_framework.authtoken.models import Token
+
+from circle.models import CircleMembership
+
+logger = logging.getLogger(__name__)
+
+POST_CREATED = "post.created"
+INVITATION_CREATED = "invitation.created"
+INVITATION_ACCEPTED = "invitation.accepted"
+
+
+class InProcessBroker:
+    """
+    Delivers events to subscribers in the current process. `publish` may be
+    called from any thread; subscribers must call `subscribe` from the event loop
+    they will read their queue on.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._ids = itertools.count(1)
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add((loop, queue))
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            subscribers.difference_update({s for s in subscribers if s[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+
+    def publish(self, user_ids, event_type, data):
+        event = {"id": next(self._ids), "type": event_type, "data": data}
+        with self._lock:
+            targets = [
+                subscriber
+                for user_id in set(user_ids)
+                for subscriber in self._subscribers.get(user_id, ())
+            ]
+        for loop, queue in targets:
+            loop.call_soon_threadsafe(_offer, queue, event)
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Delivers events to subscribers in every process sharing the database.
+    `publish` sends a NOTIFY; each process that has subscribers keeps one extra
+    connection LISTENing and hands what it hears to its own subscribers.
+    """
+
+    channel = "circle_events"
+    # NOTIFY payloads are limited to 8000 bytes, so large circles are split up.
+    user_ids_per_notify = 500
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def subscribe(self, user_id):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self._listen_forever, name="events-listener", daemon=True
+                )
+                self._listener.start()
+        return super().subscribe(user_id)
+
+    def publish(self, user_ids, event_type, data):
+        user_ids = sorted(set(user_ids))
+        with connection.cursor() as cursor:
+            for start in range(0, len(user_ids), self.user_ids_per_notify):
+                payload = {
+                    "user_ids": user_ids[start : start + self.user_ids_per_notify],
+                    "type": event_type,
+                    "data": data,
+                }
+                cursor.execute(
+                    "SELECT pg_notify(%s, %s)", [self.channel, json.dumps(payload)]
+                )
+
+    def _listen_forever(self):
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Lost the events listener connection; reconnecting")
+                time.sleep(1)
+
+    def _listen(self):
+        wrapper = connections["default"]
+        listener = wrapper.get_new_connection(wrapper.get_connection_params())
+        try:
+            listener.autocommit = True
+            with listener.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.channel}")
+            while True:
+                if select.select([listener], [], [], 60) == ([], [], []):
+                    continue
+                listener.poll()
+                while listener.notifies:
+                    event = json.loads(listener.notifies.pop(0).payload)
+                    super().publish(event["user_ids"], event["type"], event["data"])
+        finally:
+            listener.close()
+
+
+def _offer(queue, event):
+    # A client that can't keep up misses events rather than growing memory.
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass
+
+
+_brokers = {}
+
+
+def get_broker():
+    path = settings.EVENTS_BROKER
+    if path not in _brokers:
+        _brokers[path] = import_string(path)()
+    return _brokers[path]
+
+
+def publish_to_circles(messages):
+    """
+    Send events to the members of their circles once the current transaction
+    commits. `messages` are `(circle_id, event_type, data, extra_user_ids)`
+    tuples; the members of all their circles are looked up in one query.
+    """
+    messages = list(messages)
+    if not messages:
+        return
+
+    def publish():
+        members = {}
+        memberships = CircleMembership.objects.filter(
+            circle_id__in={message[0] for message in messages}
+        ).values_list("circle_id", "user_id")
+        for circle_id, user_id in memberships:
+            members.setdefault(circle_id, set()).add(user_id)
+        broker = get_broker()
+        for circle_id, event_type, data, extra_user_ids in messages:
+            user_ids = members.get(circle_id, set()) | set(extra_user_ids)
+            broker.publish(user_ids, event_type, data)
+
+    transaction.on_commit(publish)
+
+
+def publish_to_circle(circle_id, event_type, data, extra_user_ids=()):
+    """
+    Send an event to every member of a circle (plus `extra_user_ids`) once the
+    current transaction commits.
+    """
+    publish_to_circles([(circle_id, event_type, data, extra_user_ids)])
+
+
+def posts_created(posts):
+    publish_to_circles(
+        (
+            post.circle_id,
+            POST_CREATED,
+            {"pk": post.pk, "circle": post.circle_id, "author": post.author.name},
+            (),
+        )
+        for post in posts
+    )
+
+
+def post_created(post):
+    posts_created([post])
+
+
+def invitations_created(invitations):
+    publish_to_circles(
+        (
+            invitation.circle_id,
+            INVITATION_CREATED,
+            {"pk": invitation.pk, "circle": invitation.circle_id},
+            [invitation.invitee_id],
+        )
+        for invitation in invitations
+    )
+
+
+def invitation_created(invitation):
+    invitations_created([invitation])
+
+
+def invitation_accepted(invitation):
+    publish_to_circle(
+        invitation.circle_id,
+        INVITATION_ACCEPTED,
+        {"circle": invitation.circle_id, "invitee": invitation.invitee.name},
+    )
+
+
+def format_event(event):
+    return (
+        f"id: {event['id']}\n"
+        f"event: {event['type']}\n"
+        f"data: {json.dumps(event['data'])}\n\n"
+    ).encode()
+
+
+@sync_to_async
+def _user_id_for_token(key):
+    return (
+        Token.objects.filter(key=key, user__is_active=True)
+        .values_list("user_id", flat=True)
+        .first()
+    )
+
+
+def _token_from_scope(scope):
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            keyword, _, key = value.decode("latin1").partition(" ")
+            if keyword == "Token" and key:
+                return key.strip()
+    query = parse_qs(scope.get("query_string", b"").decode("latin1"))
+    return query.get("token", [None])[0]
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def event_stream(scope, receive, send):
+    """ASGI app serving the event stream for the authenticated user."""
+    key = _token_from_scope(scope)
+    user_id = await _user_id_for_token(key) if key else None
+    if user_id is None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 401,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        await send(
+            {
+                "type": "http.response.body",
+                "body": b'{"detail": "Invalid or missing token."}',
+            }
+        )
+        return
+
+    broker = get_broker()
+    queue = broker.subscribe(user_id)
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        while not disconnect.done():
+            next_event = asyncio.ensure_future(queue.get())
+            await asyncio.wait(
+                {next_event, disconnect},
+                timeout=settings.EVENTS_HEARTBEAT,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if next_event.done():
+                body = format_event(next_event.result())
+            else:
+                next_event.cancel()
+                if disconnect.done():
+                    break
+                body = b": keepalive\n\n"
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+    finally:
+        disconnect.cancel()
+        broker.unsubscribe(user_id, queue)
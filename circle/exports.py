@@ -0,0 +1,151 @@
+"""
+"Export my data" archives.
+
+An export is written as one or more zip files in the private storage (see
+circle/storage.py), each holding up to `EXPORT_POSTS_PER_PART` posts:
+
+    posts.jsonl     one JSON object per post
+    images/...      the posts' images
+                    (a post whose image file is gone has "image_missing": true)
+    circles.json    the user's circle memberships (first part only)
+
+The posts still in the posts table come first, then the archived ones (see
+circle/archive.py), which are added a whole archive at a time and so can make a
+part larger. A post archived while its export runs may be in the export twice,
+but none is left out.
+
+Each part is built in a temporary file, with images copied across in chunks, so
+memory use does not grow with the size of the export. After each part is saved
+the export records the last post and archive it contains; if the job is
+interrupted, the retry carries on from there.
+"""
+import posixpath
+import tempfile
+import zipfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from circle import archive, jobs
+from circle.models import CircleMembership, JobStatus, Post
+from circle.storage import private_storage
+
+
+def part_name(export, number):
+    return f"exports/{export.user_id}/{export.pk}/part-{number:04d}.zip"
+
+
+def _post_record(post):
+    return {
+        "id": post.pk,
+        "circle": post.circle_id,
+        "circle_name": post.circle.name,
+        "body": post.body,
+        "image": post.image.name or None,
+        "posted_at": post.posted_at,
+    }
+
+
+def _archived_record(record):
+    return {
+        key: record[key]
+        for key in ("id", "circle", "circle_name", "body", "image", "posted_at")
+    }
+
+
+def _circles_record(user):
+    return list(
+        CircleMembership.objects.filter(user=user)
+        .order_by("pk")
+        .values("circle_id", "role", "joined_at", circle_name=F("circle__name"))
+    )
+
+
+def write_export_part(export):
+    """
+    Write the next part of an export to storage. Returns False once there is
+    nothing left to write.
+    """
+    renderer = JSONRenderer()
+    first_part = not export.parts
+    posts = [
+        _post_record(post)
+        for post in Post.objects.filter(
+            author_id=export.user_id, pk__gt=export.last_post_id
+        )
+        .select_related("circle")
+        .order_by("pk")[: settings.EXPORT_POSTS_PER_PART]
+    ]
+    last_post_id, last_archive_id = export.last_post_id, export.last_archive_id
+    if posts:
+        last_post_id = posts[-1]["id"]
+    else:
+        archived, last_archive_id = archive.authored(
+            export.user_id, export.last_archive_id, settings.EXPORT_POSTS_PER_PART
+        )
+        posts = [_archived_record(record) for record in archived]
+    if not posts and not first_part:
+        return False
+
+    with tempfile.TemporaryFile() as file:
+        with zipfile.ZipFile(file, "w", compression=zipfile.ZIP_DEFLATED) as zipped:
+            if first_part:
+                zipped.writestr(
+                    "circles.json", renderer.render(_circles_record(export.user))
+                )
+            for post in posts:
+                if post["image"] and not _copy_image(zipped, post):
+                    post["image_missing"] = True
+            with zipped.open("posts.jsonl", "w") as posts_file:
+                for post in posts:
+                    posts_file.write(renderer.render(post) + b"\n")
+
+        name = part_name(export, len(export.parts) + 1)
+        # A previous attempt may have saved this part before it was interrupted.
+        private_storage.delete(name)
+        file.seek(0)
+        name = private_storage.save(name, File(file))
+
+    export.parts = export.parts + [name]
+    export.last_post_id = last_post_id
+    export.last_archive_id = last_archive_id
+    export.save(update_fields=["parts", "last_post_id", "last_archive_id"])
+    return bool(posts)
+
+
+def _copy_image(zipped, post):
+    """
+    Copy a post's image into the zip file. Returns False if the file is missing
+    from storage, which shouldn't fail the rest of the export.
+    """
+    path = posixpath.join("images", str(post["id"]), posixpath.basename(post["image"]))
+    try:
+        source = default_storage.open(post["image"], "rb")
+    except FileNotFoundError:
+        return False
+    with source, zipped.open(path, "w", force_zip64=True) as target:
+        for chunk in source.chunks():
+            target.write(chunk)
+    return True
+
+
+def run_export(export):
+    export.status = JobStatus.RUNNING
+    export.save(update_fields=["status"])
+    try:
+        while write_export_part(export):
+            pass
+    except Exception:
+        # Otherwise the export would stay running, and block new ones, for good.
+        if jobs.is_final_attempt():
+            export.status = JobStatus.FAILED
+            export.finished_at = timezone.now()
+            export.save(update_fields=["status", "finished_at"])
+        raise
+    export.status = JobStatus.DONE
+    export.finished_at = timezone.now()
+    export.save(update_fields=["status", "finished_at"])
@@ -0,0 +1,245 @@
+"""
+A small database-backed job queue.
+
+Jobs are rows in the `Job` table. Anything that does not need to happen inside
+the request/response cycle can be handed off with `enqueue`:
+
+    enqueue("circle.tasks.some_task", post.pk)
+
+and is later picked up by `./manage.py runworker`.
+
+- Jobs are inserted in the caller's transaction, so a worker can only see a job
+  once the transaction that enqueued it has committed, and a rolled back
+  transaction never leaves a job behind.
+- On PostgreSQL, workers claim jobs with `SELECT ... FOR UPDATE SKIP LOCKED`, so
+  many workers can poll the same table without blocking each other. Databases
+  without SKIP LOCKED (SQLite) fall back to a compare-and-set `UPDATE`.
+- A job that raises is retried with exponential backoff until it runs out of
+  attempts, at which point it is marked as failed.
+- Workers refresh the lock on the jobs they are running every
+  `JOB_HEARTBEAT_INTERVAL` seconds, and `report_progress` refreshes it too. A
+  job whose lock has not been refreshed for `JOB_LOCK_TIMEOUT` seconds, most
+  likely because its worker died, is released and may be claimed again. The
+  outcome is only recorded if the job is still held by the same claim, so a
+  worker that finishes late can't overwrite the run that replaced it.
+"""
+import logging
+import os
+import socket
+import traceback
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from circle import slowlog
+from circle.models import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+_current_job = ContextVar("current_job", default=None)
+
+
+def _db():
+    return router.db_for_write(Job)
+
+
+def enqueue(task, *args, run_at=None, max_attempts=None, **kwargs):
+    """
+    Queue `task` (a dotted path to a function) to be called with the given
+    arguments by a worker. Arguments must be JSON-serializable.
+    """
+    if max_attempts is None:
+        max_attempts = settings.JOB_MAX_ATTEMPTS
+    return Job.objects.using(_db()).create(
+        task=task,
+        args=list(args),
+        kwargs=kwargs,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts,
+    )
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_jobs(limit, worker=None):
+    """
+    Mark up to `limit` due jobs as running and return their primary keys.
+    """
+    worker = worker or worker_name()
+    db = _db()
+    now = timezone.now()
+    due = (
+        Job.objects.using(db)
+        .filter(status=JobStatus.QUEUED, run_at__lte=now)
+        .order_by("run_at", "pk")
+    )
+    claim = {
+        "status": JobStatus.RUNNING,
+        "locked_at": now,
+        "locked_by": worker,
+        "attempts": F("attempts") + 1,
+    }
+
+    with transaction.atomic(using=db):
+        if connections[db].features.has_select_for_update_skip_locked:
+            pks = list(
+                due.select_for_update(skip_locked=True).values_list("pk", flat=True)[
+                    :limit
+                ]
+            )
+            Job.objects.using(db).filter(pk__in=pks).update(**claim)
+            return pks
+
+        # Without SKIP LOCKED, only keep the jobs that were still queued when
+        # we flipped them to running. Another worker may have won the race.
+        candidates = list(due.values_list("pk", flat=True)[:limit])
+        return [
+            pk
+            for pk in candidates
+            if Job.objects.using(db)
+            .filter(pk=pk, status=JobStatus.QUEUED)
+            .update(**claim)
+        ]
+
+
+def heartbeat(pks, worker=None):
+    """
+    Refresh the lock on jobs that `worker` is still running, so that
+    `release_stale_jobs` leaves them alone.
+    """
+    worker = worker or worker_name()
+    return (
+        Job.objects.using(_db())
+        .filter(pk__in=pks, status=JobStatus.RUNNING, locked_by=worker)
+        .update(locked_at=timezone.now())
+    )
+
+
+def release_stale_jobs():
+    """
+    Requeue jobs whose lock has not been refreshed for `JOB_LOCK_TIMEOUT`
+    seconds, most likely because their worker died.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    return (
+        Job.objects.using(_db())
+        .filter(status=JobStatus.RUNNING, locked_at__lt=cutoff)
+        .update(status=JobStatus.QUEUED, locked_at=None, locked_by="")
+    )
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that has failed `attempts` times."""
+    return min(
+        settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_DELAY
+    )
+
+
+def report_progress(**progress):
+    """
+    Record how far the running job has got, e.g. `report_progress(deleted=500)`,
+    and refresh its lock. Does nothing when called outside of a job.
+    """
+    pk = _current_job.get()
+    if pk is not None:
+        Job.objects.using(_db()).filter(pk=pk).update(
+            progress=progress, locked_at=timezone.now()
+        )
+
+
+def is_final_attempt():
+    """
+    Whether the running job will be marked failed, rather than retried, if it
+    raises. False when called outside of a job.
+    """
+    pk = _current_job.get()
+    if pk is None:
+        return False
+    job = Job.objects.using(_db()).only("attempts", "max_attempts").get(pk=pk)
+    return job.attempts >= job.max_attempts
+
+
+def run_job(pk):
+    """
+    Run a claimed job and record the outcome. Returns the job's new status, or
+    None if the job was released and claimed again while it ran.
+    """
+    db = _db()
+    job = Job.objects.using(db).get(pk=pk)
+    claim = {"locked_by": job.locked_by, "attempts": job.attempts}
+    token = _current_job.set(pk)
+    try:
+        func = import_string(job.task)
+        func(*job.args, **job.kwargs)
+    except Exception:
+        logger.exception("Job %s (%s) failed", job.pk, job.task)
+        job.last_error = traceback.format_exc()
+        job.locked_at = None
+        job.locked_by = ""
+        if job.attempts >= job.max_attempts:
+            job.status = JobStatus.FAILED
+            job.finished_at = timezone.now()
+        else:
+            job.status = JobStatus.QUEUED
+            job.run_at = timezone.now() + timedelta(seconds=backoff(job.attempts))
+    else:
+        job.status = JobStatus.DONE
+        job.finished_at = timezone.now()
+    finally:
+        _current_job.reset(token)
+    # Leave `progress` alone, as the job may have updated it.
+    recorded = (
+        Job.objects.using(db)
+        .filter(pk=pk, status=JobStatus.RUNNING, **claim)
+        .update(
+            status=job.status,
+            run_at=job.run_at,
+            locked_at=job.locked_at,
+            locked_by=job.locked_by,
+            last_error=job.last_error,
+            finished_at=job.finished_at,
+        )
+    )
+    if not recorded:
+        logger.warning(
+            "Job %s (%s) was released while it ran; not recording its outcome",
+            job.pk,
+            job.task,
+        )
+        return None
+    return job.status
+
+
+def run_job_in_worker(pk):
+    """
+    Entry point for pool workers. Each thread or child process holds its own
+    database connection, which is tidied up after every job.
+    """
+    close_old_connections()
+    try:
+        with slowlog.slow_query_logging():
+            return run_job(pk)
+    finally:
+        close_old_connections()
+
+
+def run_pending(limit=None):
+    """
+    Claim and run due jobs one at a time in the current thread until there are
+    none left (or `limit` have run). Returns the number of jobs run.
+    """
+    count = 0
+    while limit is None or count < limit:
+        pks = claim_jobs(1)
+        if not pks:
+            break
+        run_job(pks[0])
+        count += 1
+    return count
@@ -0,0 +1,34 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from circle.archive import archive_posts, hot_cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        "Move posts older than POST_HOT_DAYS (or --before a date) out of the posts "
+        "table into gzipped JSON lines archives in storage, one per circle and "
+        "month. They can still be read through /posts/history/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before", help="Archive posts from before this date (YYYY-MM-DD)."
+        )
+
+    def handle(self, *args, before, **options):
+        if before is None:
+            cutoff = hot_cutoff()
+        else:
+            date = parse_date(before)
+            if date is None:
+                raise CommandError("--before must be a date, e.g. 2025-01-01.")
+            cutoff = timezone.make_aware(
+                datetime.datetime.combine(date, datetime.time())
+            )
+
+        total = archive_posts(cutoff, report=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"Done, {total} posts archived."))
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from circle.replicas import check_replicas
+
+
+class Command(BaseCommand):
+    help = "Report replication lag for each read replica. Exits non-zero if any replica is unhealthy."
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            self.stdout.write("No replicas configured.")
+            return
+
+        unhealthy = []
+        for alias, lag in check_replicas().items():
+            if lag is None:
+                self.stdout.write(f"{alias}: unreachable")
+                unhealthy.append(alias)
+            else:
+                self.stdout.write(f"{alias}: {lag:.1f}s behind")
+                if lag > settings.REPLICA_MAX_LAG:
+                    unhealthy.append(alias)
+
+        if unhealthy:
+            raise CommandError(f"Unhealthy replicas: {', '.join(unhealthy)}")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from circle.models import Circle, User
+from circle.purge import purge_circle, purge_user
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove every circle and user that has been marked deleted, in batches. "
+        "Normally the background jobs queued on deletion do this."
+    )
+
+    def handle(self, *args, **options):
+        for pk in Circle.objects.filter(deleted_at__isnull=False).values_list(
+            "pk", flat=True
+        ):
+            purge_circle(pk, report=self.stdout.write)
+        for pk in User.objects.filter(deleted_at__isnull=False).values_list(
+            "pk", flat=True
+        ):
+            purge_user(pk, report=self.stdout.write)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from circle.unread import recount
+
+
+class Command(BaseCommand):
+    help = (
+        "Count every member's unread posts again from the posts table, e.g. after "
+        "posts were deleted outside the API."
+    )
+
+    def handle(self, *args, **options):
+        total = recount()
+        self.stdout.write(self.style.SUCCESS(f"Done, {total} memberships recounted."))
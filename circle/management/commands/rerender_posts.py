@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from circle.models import Post
+from circle.rendering import RENDERER_VERSION
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-render the stored HTML of posts that were rendered by an older version "
+        "of the Markdown renderer. Run this after deploying a new RENDERER_VERSION."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            dest="rerender_all",
+            help="Re-render every post, not just stale ones."
+        )
+
+    def handle(self, *args, batch_size, rerender_all, **options):
+        posts = Post.objects.order_by("pk").only("pk", "body")
+        if not rerender_all:
+            posts = posts.exclude(body_html_version=RENDERER_VERSION)
+
+        last_pk = 0
+        total = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            for post in batch:
+                post.render_body()
+            Post.objects.bulk_update(batch, ["body_html", "body_html_version"])
+            last_pk = batch[-1].pk
+            total += len(batch)
+            self.stdout.write(f"Rendered {total} posts")
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {total} posts rendered."))
@@ -0,0 +1,94 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _init_process():
+    """
+    Set up Django in a freshly spawned child process. This module is imported by
+    the child before Django is ready, so it must not import any models at the top.
+    """
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the job table using a pool of threads or processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.JOB_WORKERS,
+            help="Number of jobs to run at once.",
+        )
+        parser.add_argument(
+            "--mode",
+            choices=["thread", "process"],
+            default=settings.JOB_WORKER_MODE,
+            help="Run jobs in a thread pool or a process pool.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.JOB_POLL_INTERVAL,
+            help="Seconds to sleep when there are no jobs to run.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once there are no more due jobs instead of polling forever.",
+        )
+
+    def handle(self, *args, workers, mode, poll_interval, once, **options):
+        from circle import jobs
+
+        if mode == "process":
+            # Connections must never be shared with forked children.
+            connections.close_all()
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process,
+            )
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+
+        worker = jobs.worker_name()
+        self.stdout.write(f"Worker {worker} running {workers} {mode}(s)")
+        running = {}
+        last_heartbeat = time.monotonic()
+        try:
+            while True:
+                if len(running) < workers:
+                    jobs.release_stale_jobs()
+                    for pk in jobs.claim_jobs(workers - len(running), worker=worker):
+                        running[executor.submit(jobs.run_job_in_worker, pk)] = pk
+
+                if running and (
+                    time.monotonic() - last_heartbeat >= settings.JOB_HEARTBEAT_INTERVAL
+                ):
+                    jobs.heartbeat(list(running.values()), worker=worker)
+                    last_heartbeat = time.monotonic()
+
+                if not running:
+                    if once:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                done, _ = wait(
+                    running, timeout=poll_interval, return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    del running[future]
+                    if future.exception() is not None:
+                        self.stderr.write(f"Worker error: {future.exception()!r}")
+        except KeyboardInterrupt:
+            self.stdout.write("Shutting down, waiting for running jobs to finish")
+        finally:
+            executor.shutdown(wait=True)
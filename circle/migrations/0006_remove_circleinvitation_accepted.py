@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('circle', '0005_job'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='circleinvitation',
+            name='accepted',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('circle', '0007_dataexport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='body_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='body_html_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
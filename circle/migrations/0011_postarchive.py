@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('circle', '0010_soft_delete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostArchive',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('file', models.CharField(max_length=255)),
+                ('post_count', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('circle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_archives', to='circle.circle')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('circle', 'month'), name='unique_circle_month')],
+            },
+        ),
+    ]
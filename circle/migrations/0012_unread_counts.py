@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('circle', '0011_postarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='circlemembership',
+            name='last_read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='circlemembership',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
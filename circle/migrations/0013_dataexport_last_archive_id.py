@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('circle', '0012_unread_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataexport',
+            name='last_archive_id',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:02
+
+from django.db import migrations, models
+from django.db.models import Count
+
+ROLE_RANK = {'OWNER': 0, 'ADMIN': 1, 'MEMBER': 2}
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Keep one membership per user and circle, and one invitation per invitee and
+    circle, so that the constraints can be added. Of duplicate memberships the
+    one with the highest role is kept; otherwise the oldest row is.
+    """
+    for model_name, fields in [
+        ('CircleMembership', ['user', 'circle']),
+        ('CircleInvitation', ['invitee', 'circle']),
+    ]:
+        model = apps.get_model('circle', model_name)
+        duplicates = (
+            model.objects.values(*fields)
+            .annotate(count=Count('pk'))
+            .filter(count__gt=1)
+        )
+        for duplicate in duplicates:
+            rows = model.objects.filter(**{field: duplicate[field] for field in fields})
+            keep = min(rows, key=lambda row: (ROLE_RANK.get(row.role, 3), row.pk))
+            rows.exclude(pk=keep.pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('circle', '0015_post_circle_posted_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='circleinvitation',
+            constraint=models.UniqueConstraint(fields=('invitee', 'circle'), name='unique_invitee_circle'),
+        ),
+        migrations.AddConstraint(
+            model_name='circlemembership',
+            constraint=models.UniqueConstraint(fields=('user', 'circle'), name='unique_user_circle'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:31
+
+from django.db import migrations
+
+from circle.rendering import RENDERER_VERSION, render_markdown
+
+BATCH_SIZE = 500
+
+
+def render_bodies(apps, schema_editor):
+    """
+    Render the posts written before `body_html` existed. Each batch is committed
+    on its own, so a large posts table is never locked for the whole run.
+    """
+    Post = apps.get_model('circle', 'Post')
+    posts = (
+        Post.objects.exclude(body_html_version=RENDERER_VERSION)
+        .order_by('pk')
+        .only('pk', 'body')
+    )
+    last_pk = 0
+    while True:
+        batch = list(posts.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        for post in batch:
+            post.body_html = render_markdown(post.body)
+            post.body_html_version = RENDERER_VERSION
+        Post.objects.bulk_update(batch, ['body_html', 'body_html_version'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('circle', '0017_cache_table'),
+    ]
+
+    operations = [
+        migrations.RunPython(render_bodies, migrations.RunPython.noop),
+    ]
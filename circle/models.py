@@ -1,13 +1,16 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
 from django.db.models.query_utils import Q
+from django.db.models.functions import Lower
 from django.utils import timezone
 from django.contrib.auth.hashers import make_password
 
+from circle.rendering import RENDERER_VERSION, render_markdown
+
 
 class UserManager(BaseUserManager):
     def _create_user(self, email, date_of_birth, password, **extra_fields):
@@ -48,6 +51,15 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_staff = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
     date_joined = models.DateTimeField(default=timezone.now)
+    # Set when the account is deleted. The row and everything that belongs to it
+    # is removed later by a background job; see circle.purge.
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Inviting by email matches addresses in any case.
+            models.Index(Lower("email"), name="user_email_lower"),
+        ]
 
     def get_full_name(self):
         """Replacing built-in get_full_name from AbstractUser"""
@@ -57,27 +69,57 @@ class User(AbstractBaseUser, PermissionsMixin):
         """Replacing built-in get_short_name from AbstractUser"""
         return self.name
 
+    def soft_delete(self):
+        """
+        Deactivate the account straight away and queue the removal of the user
+        and all of their posts, memberships and invitations.
+        """
+        from circle import directory, jobs
+
+        with transaction.atomic():
+            self.is_active = False
+            self.deleted_at = timezone.now()
+            self.save(update_fields=["is_active", "deleted_at"])
+            jobs.enqueue("circle.tasks.purge_user", self.pk)
+            directory.invalidate_user(self.pk)
+
 
 class Circle(models.Model):
     name = models.CharField(max_length=255)
     members = models.ManyToManyField(
         to=User, through="CircleMembership", related_name="circles"
     )
+    # Set when the circle is deleted. It is hidden from then on and removed,
+    # along with its posts, by a background job; see circle.purge.
+    deleted_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.name
 
+    def soft_delete(self):
+        from circle import directory, jobs
+
+        with transaction.atomic():
+            self.deleted_at = timezone.now()
+            self.save(update_fields=["deleted_at"])
+            jobs.enqueue("circle.tasks.purge_circle", self.pk)
+            directory.invalidate_circle(self.pk)
+
     def is_owner_or_admin(self, user):
-        return (
-            self.memberships.filter(
-                Q(user=user), Q(role=CircleRole.ADMIN) | Q(role=CircleRole.OWNER)
-            ).count()
-            > 0
-        )
+        return self.memberships.filter(
+            Q(user=user), Q(role=CircleRole.ADMIN) | Q(role=CircleRole.OWNER)
+        ).exists()
+
+    def has_member(self, user):
+        return self.memberships.filter(user=user).exists()
 
     def add_members(self, role, users):
-        for user in users:
-            self.memberships.create(user=user, role=role)
+        from circle import directory
+
+        self.memberships.bulk_create(
+            [CircleMembership(circle=self, user=user, role=role) for user in users]
+        )
+        directory.invalidate_circle(self.pk)
 
 
 class CircleRole(models.TextChoices):
@@ -97,6 +139,9 @@ class CircleMembership(models.Model):
         max_length=10, choices=CircleRole.choices, default=CircleRole.MEMBER
     )
     joined_at = models.DateTimeField(auto_now_add=True)
+    # Kept up to date by circle.unread, so the home screen doesn't count posts.
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         constraints = [
@@ -123,7 +168,6 @@ class CircleInvitation(models.Model):
     role = models.CharField(
         max_length=10, choices=CircleRole.choices, default=CircleRole.MEMBER
     )
-    accepted = models.BooleanField(default=False)
     invited_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -134,14 +178,141 @@ class CircleInvitation(models.Model):
         ]
 
     def accept(self):
-        self.accepted = True
-        self.save()
-        self.circle.memberships.create(user=self.invitee, role=self.role)
+        """
+        Join the circle and remove the invitation in one transaction. Deleting the
+        row locks it, so if two requests race to accept the same invitation only
+        the first one creates a membership; the other gets `DoesNotExist`.
+        """
+        from circle import directory
+
+        with transaction.atomic():
+            deleted, _ = CircleInvitation.objects.filter(pk=self.pk).delete()
+            if not deleted:
+                raise CircleInvitation.DoesNotExist
+            membership, _ = CircleMembership.objects.get_or_create(
+                user_id=self.invitee_id,
+                circle_id=self.circle_id,
+                defaults={"role": self.role},
+            )
+            directory.invalidate_circle(self.circle_id)
+        return membership
 
 
 class Post(models.Model):
     body = models.TextField()
+    # `body` rendered from Markdown to HTML by `render_body`. See circle.rendering.
+    body_html = models.TextField(blank=True, editable=False)
+    body_html_version = models.PositiveSmallIntegerField(default=0, editable=False)
     author = models.ForeignKey(to=User, on_delete=models.CASCADE)
     circle = models.ForeignKey(to=Circle, on_delete=models.CASCADE)
     image = models.ImageField(upload_to="post_images/", null=True, blank=True)
     posted_at = models.DateTimeField(auto_now_add=True)
+    # Chosen by the client so that retried batch uploads don't duplicate posts.
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["author", "idempotency_key"], name="unique_author_idempotency_key"
+            )
+        ]
+        indexes = [
+            # A circle's feed and history, newest first.
+            models.Index(fields=["circle", "posted_at"], name="post_circle_posted_at"),
+        ]
+
+    def render_body(self):
+        self.body_html = render_markdown(self.body)
+        self.body_html_version = RENDERER_VERSION
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is None or "body" in update_fields:
+            self.render_body()
+            if update_fields is not None:
+                update_fields = {*update_fields, "body_html", "body_html_version"}
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+
+class PostArchive(models.Model):
+    """
+    A month of a circle's posts, moved out of the posts table into a gzipped JSON
+    lines file in the private storage by `circle.archive`.
+    """
+
+    circle = models.ForeignKey(
+        to=Circle, on_delete=models.CASCADE, related_name="post_archives"
+    )
+    month = models.DateField()
+    file = models.CharField(max_length=255)
+    post_count = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["circle", "month"], name="unique_circle_month"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.circle} - {self.month:%Y-%m}"
+
+
+class JobStatus(models.TextChoices):
+    QUEUED = "QUEUED", "Queued"
+    RUNNING = "RUNNING", "Running"
+    DONE = "DONE", "Done"
+    FAILED = "FAILED", "Failed"
+
+
+class Job(models.Model):
+    """
+    A unit of background work. `task` is the dotted path to a function that is
+    called with `args` and `kwargs` by the worker. See `circle.jobs`.
+    """
+
+    task = models.CharField(max_length=255)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=10, choices=JobStatus.choices, default=JobStatus.QUEUED
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+    # Set by the job itself through `circle.jobs.report_progress`.
+    progress = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_at"], name="job_status_run_at"),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.status})"
+
+
+class DataExport(models.Model):
+    """
+    A zip archive of everything a user has posted, built in the background by
+    `circle.exports`. Large exports are split into several zip files ("parts")
+    so an interrupted export can pick up after the last finished part.
+    """
+
+    user = models.ForeignKey(to=User, on_delete=models.CASCADE, related_name="exports")
+    status = models.CharField(
+        max_length=10, choices=JobStatus.choices, default=JobStatus.QUEUED
+    )
+    last_post_id = models.PositiveIntegerField(default=0)
+    last_archive_id = models.PositiveIntegerField(default=0)
+    parts = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Export for {self.user} ({self.status})"
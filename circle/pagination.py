@@ -0,0 +1,90 @@
+import itertools
+
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import Response
+
+
+class OptionalPageNumberPagination(PageNumberPagination):
+    """
+    Page number pagination that only kicks in when the client asks for a page
+    with `?page=` or `?page_size=`, so clients that expect a plain list keep
+    working.
+    """
+
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            self.page_query_param not in request.query_params
+            and self.page_size_query_param not in request.query_params
+        ):
+            return None
+        return super().paginate_queryset(queryset, request, view=view)
+
+
+class DirectoryPagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+def stream_json_list(queryset, serializer_class, context, prefetch=()):
+    """
+    Respond with a JSON list that is serialized and sent one chunk of rows at a
+    time, so memory use stays flat no matter how many rows there are.
+    `prefetch` lookups are applied to each chunk, as `.iterator()` skips
+    `prefetch_related`.
+    """
+    renderer = JSONRenderer()
+    chunk_size = settings.STREAM_CHUNK_SIZE
+
+    def generate():
+        rows = queryset.iterator(chunk_size=chunk_size)
+        separator = b"["
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            if prefetch:
+                prefetch_related_objects(chunk, *prefetch)
+            data = serializer_class(chunk, many=True, context=context).data
+            # Drop the brackets from each rendered chunk to join them into one list.
+            yield separator + renderer.render(data)[1:-1]
+            separator = b","
+        yield b"[]" if separator == b"[" else b"]"
+
+    return StreamingHttpResponse(generate(), content_type="application/json")
+
+
+class ListResponseMixin:
+    """
+    Adds `list_response`, which returns a queryset as a plain list, a page of it
+    (`?page=`), or a streamed list (`?stream=true`).
+    """
+
+    list_paginator_class = OptionalPageNumberPagination
+
+    def wants_stream(self):
+        return self.request.query_params.get("stream", "").lower() in ("1", "true")
+
+    def list_response(self, queryset, serializer_class, prefetch=()):
+        context = {"request": self.request}
+        if self.wants_stream():
+            return stream_json_list(queryset, serializer_class, context, prefetch)
+
+        paginator = self.list_paginator_class()
+        page = paginator.paginate_queryset(queryset, self.request, view=self)
+        if page is not None:
+            if prefetch:
+                prefetch_related_objects(page, *prefetch)
+            serializer = serializer_class(page, many=True, context=context)
+            return paginator.get_paginated_response(serializer.data)
+
+        queryset = queryset.prefetch_related(*prefetch)
+        serializer = serializer_class(queryset, many=True, context=context)
+        return Response(serializer.data)
@@ -0,0 +1,223 @@
+"""
+On-demand profiling of single requests, for staff.
+
+Send `X-Profile: cprofile` (or `?profile=cprofile`) with any request to run it
+under cProfile, or `X-Profile: sample` to sample its stack every
+`PROFILE_SAMPLE_INTERVAL` seconds instead, which slows the request down far
+less. Either way every query it makes is recorded with when it started and how
+long it took.
+
+The profile is saved under `PROFILE_DIR` and its id is returned in the
+`X-Profile-Id` response header. `/profiles/<id>/` shows the summary and query
+timeline, and `/profiles/<id>/download/` returns the raw profile: a pstats file
+for cProfile (open it with `python -m pstats` or snakeviz) or collapsed stacks
+for sampling (open them with speedscope or flamegraph.pl).
+
+Requests without the header or flag only pay for the check for it. The user is
+only looked up when it is there, including from a DRF token, which DRF itself
+would not check until the view runs.
+"""
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+MODES = ("cprofile", "sample")
+PROFILE_ID = re.compile(r"\d{14}-[0-9a-f]{8}")
+# How many functions a cProfile summary lists, by cumulative time
+TOP_FUNCTIONS = 30
+
+
+def requested_mode(request):
+    mode = request.META.get("HTTP_X_PROFILE") or request.GET.get("profile")
+    if not mode:
+        return None
+    mode = mode.lower()
+    return mode if mode in MODES else "cprofile"
+
+
+def is_staff(request):
+    if request.user.is_authenticated:
+        return request.user.is_staff
+    try:
+        authenticated = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+def profile_path(profile_id, extension):
+    return os.path.join(settings.PROFILE_DIR, f"{profile_id}.{extension}")
+
+
+def load_profile(profile_id):
+    """The summary of a saved profile, or None if there is no such profile."""
+    if not PROFILE_ID.fullmatch(profile_id):
+        return None
+    try:
+        with open(profile_path(profile_id, "json")) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def list_profiles():
+    try:
+        names = os.listdir(settings.PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    ids = sorted((name[:-5] for name in names if name.endswith(".json")), reverse=True)
+    profiles = []
+    for profile_id in ids:
+        profile = load_profile(profile_id)
+        if profile is not None:
+            profile.pop("queries")
+            profile.pop("functions", None)
+            profiles.append(profile)
+    return profiles
+
+
+class QueryTimeline:
+    """A database execute wrapper that records when each query ran."""
+
+    def __init__(self, start):
+        self.start = start
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            finished = time.perf_counter()
+            self.queries.append(
+                {
+                    "database": context["connection"].alias,
+                    "start_ms": round((started - self.start) * 1000, 3),
+                    "duration_ms": round((finished - started) * 1000, 3),
+                    "sql": sql,
+                }
+            )
+
+
+class StackSampler(threading.Thread):
+    """
+    Counts the stacks of another thread, sampled every `interval` seconds.
+    Started and stopped like a `cProfile.Profile`.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.finished = threading.Event()
+
+    def run(self):
+        while not self.finished.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                filename = os.path.basename(code.co_filename)
+                stack.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def enable(self):
+        self.start()
+
+    def disable(self):
+        self.finished.set()
+        self.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+
+def summarize_stats(profiler):
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+    functions = []
+    for (filename, line, name), (_, calls, total, cumulative, _) in rows:
+        functions.append(
+            {
+                "function": f"{filename}:{line}({name})",
+                "calls": calls,
+                "total_ms": round(total * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3),
+            }
+        )
+    return functions[:TOP_FUNCTIONS]
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = requested_mode(request)
+        if mode is None or not is_staff(request):
+            return self.get_response(request)
+        return self.profile(request, mode)
+
+    def profile(self, request, mode):
+        profile_id = f"{timezone.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+        start = time.perf_counter()
+        timeline = QueryTimeline(start)
+        if mode == "sample":
+            profiler = StackSampler(
+                threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL
+            )
+        else:
+            profiler = cProfile.Profile()
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timeline))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        summary = {
+            "id": profile_id,
+            "mode": mode,
+            "method": request.method,
+            "path": request.get_full_path(),
+            "status": response.status_code,
+            "created_at": timezone.now().isoformat(),
+            "duration_ms": round(duration * 1000, 3),
+            "query_count": len(timeline.queries),
+            "query_ms": round(sum(q["duration_ms"] for q in timeline.queries), 3),
+            "queries": timeline.queries,
+        }
+        if mode == "sample":
+            summary["samples"] = sum(profiler.stacks.values())
+            with open(profile_path(profile_id, "collapsed"), "w") as file:
+                file.write(profiler.collapsed())
+        else:
+            summary["functions"] = summarize_stats(profiler)
+            profiler.dump_stats(profile_path(profile_id, "prof"))
+        with open(profile_path(profile_id, "json"), "w") as file:
+            json.dump(summary, file)
+
+        response["X-Profile-Id"] = profile_id
+        return response
@@ -0,0 +1,139 @@
+"""
+Removal of deleted circles and users.
+
+Deleting a circle or user through the API only marks it deleted (see
+`Circle.soft_delete` and `User.soft_delete`), which hides it at once. The rows
+that belong to it are removed here, in a background job, `PURGE_BATCH_SIZE` rows
+at a time so that no single statement locks a large part of a table. Post images
+are removed from storage once their posts are gone, and archived posts are
+removed from their archives (see circle.archive). Progress is recorded on the job
+after every batch.
+"""
+import logging
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from rest_framework.authtoken.models import Token
+
+from circle import archive, jobs, unread
+from circle.models import (
+    Circle,
+    CircleInvitation,
+    CircleMembership,
+    DataExport,
+    Post,
+    PostArchive,
+    User,
+)
+from circle.storage import private_storage
+
+logger = logging.getLogger(__name__)
+
+
+class Purge:
+    def __init__(self, label, report=None):
+        self.label = label
+        self.report = report
+        self.deleted = {}
+
+    def progress(self, step):
+        jobs.report_progress(purging=self.label, step=step, deleted=self.deleted)
+        if self.report:
+            self.report(f"{self.label}: {step}, deleted {self.deleted}")
+
+    def delete_in_batches(self, queryset, step, before_delete=None):
+        """
+        Delete the rows of `queryset` in batches. `before_delete`, given each batch,
+        returns the `(storage, name)` of files to delete once the rows are gone.
+        """
+        model = queryset.model
+        while True:
+            batch = list(
+                queryset.order_by("pk").values_list("pk", flat=True)[
+                    : settings.PURGE_BATCH_SIZE
+                ]
+            )
+            if not batch:
+                break
+            rows = model.objects.filter(pk__in=batch)
+            files = before_delete(rows) if before_delete else []
+            rows.delete()
+            for storage, name in files:
+                delete_file(storage, name)
+            self.deleted[step] = self.deleted.get(step, 0) + len(batch)
+            self.progress(step)
+
+
+def delete_file(storage, name):
+    try:
+        storage.delete(name)
+    except Exception:
+        # The rows are gone either way; an orphaned file is not worth a retry.
+        logger.exception("Could not delete %s from storage", name)
+
+
+def _post_images(posts):
+    return [
+        (default_storage, name)
+        for name in posts.values_list("image", flat=True)
+        if name
+    ]
+
+
+def _export_files(exports):
+    return [
+        (private_storage, name)
+        for parts in exports.values_list("parts", flat=True)
+        for name in parts
+    ]
+
+
+def purge_circle(circle_pk, report=None):
+    circle = Circle.objects.filter(pk=circle_pk, deleted_at__isnull=False).first()
+    if circle is None:
+        return
+    purge = Purge(f"circle {circle_pk}", report)
+    purge.delete_in_batches(
+        Post.objects.filter(circle=circle), "posts", before_delete=_post_images
+    )
+    purge.delete_in_batches(
+        PostArchive.objects.filter(circle=circle),
+        "archived posts",
+        before_delete=archive.archive_files,
+    )
+    purge.delete_in_batches(
+        CircleInvitation.objects.filter(circle=circle), "invitations"
+    )
+    purge.delete_in_batches(
+        CircleMembership.objects.filter(circle=circle), "memberships"
+    )
+    circle.delete()
+    purge.progress("done")
+
+
+def purge_user(user_pk, report=None):
+    user = User.objects.filter(pk=user_pk, deleted_at__isnull=False).first()
+    if user is None:
+        return
+    purge = Purge(f"user {user_pk}", report)
+    purge.delete_in_batches(
+        Post.objects.filter(author=user), "posts", before_delete=_post_images
+    )
+    circle_ids = list(user.memberships.values_list("circle_id", flat=True))
+    for name in archive.remove_author(user.pk, circle_ids):
+        delete_file(default_storage, name)
+    purge.progress("archived posts")
+    purge.delete_in_batches(
+        CircleInvitation.objects.filter(invitee=user), "invitations"
+    )
+    purge.delete_in_batches(CircleMembership.objects.filter(user=user), "memberships")
+    unread.recount(circle_ids)
+    purge.progress("unread counts")
+    purge.delete_in_batches(
+        DataExport.objects.filter(user=user),
+        "exports",
+        before_delete=_export_files,
+    )
+    Token.objects.filter(user=user).delete()
+    user.delete()
+    purge.progress("done")
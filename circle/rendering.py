@@ -0,0 +1,55 @@
+"""
+Server-side Markdown rendering for post bodies.
+
+Posts are rendered once, when they are saved, and the HTML is stored on the
+post. Bump `RENDERER_VERSION` whenever the output of `render_markdown` changes,
+then run `./manage.py rerender_posts` to bring stored HTML up to date.
+
+Raw HTML in the source is escaped rather than passed through, and links and
+images may only use http, https or mailto URLs, so the output is safe to insert
+into a page.
+"""
+import html
+import re
+from urllib.parse import urlsplit
+
+import markdown
+from markdown.extensions import Extension
+from markdown.treeprocessors import Treeprocessor
+
+RENDERER_VERSION = 2
+
+SAFE_URL_SCHEMES = {"", "http", "https", "mailto"}
+
+# Browsers ignore whitespace and control characters inside a URL's scheme.
+_IGNORED_URL_CHARACTERS = re.compile(r"[\x00-\x20\x7f]+")
+
+
+def is_safe_url(url):
+    # Check the URL as the browser will see it, with character references like
+    # `&#106;` decoded.
+    url = _IGNORED_URL_CHARACTERS.sub("", html.unescape(url))
+    scheme = urlsplit(url).scheme
+    return scheme.lower() in SAFE_URL_SCHEMES
+
+
+class SafeURLTreeprocessor(Treeprocessor):
+    def run(self, root):
+        for element in root.iter():
+            for attribute in ("href", "src"):
+                url = element.get(attribute)
+                if url is not None and not is_safe_url(url):
+                    del element.attrib[attribute]
+
+
+class SafeMarkdownExtension(Extension):
+    def extendMarkdown(self, md):
+        md.preprocessors.deregister("html_block")
+        md.inlinePatterns.deregister("html")
+        md.treeprocessors.register(SafeURLTreeprocessor(md), "safe_urls", 0)
+
+
+def render_markdown(text):
+    return markdown.markdown(
+        text, extensions=["fenced_code", "sane_lists", SafeMarkdownExtension()]
+    )
@@ -0,0 +1,214 @@
+"""
+Read replica routing.
+
+Replicas are configured with `REPLICA_DATABASE_URLS` and show up as the
+`replica_0`, `replica_1`, ... database aliases listed in `DATABASE_REPLICAS`.
+`ReplicaRouter` sends reads to a random healthy replica and every write to the
+primary (`default`).
+
+To keep read-your-writes behaviour, `ReplicaStickinessMiddleware` pins a user to
+the primary for `REPLICA_STICKY_SECONDS` after any unsafe request they make. The
+pin is an entry in the default cache keyed by user id, which every web process
+shares, so it covers token clients and the user's other devices too. Anonymous
+clients (e.g. someone who has just signed up) are pinned with a short-lived
+cookie instead. Streamed responses keep the request's choice while they are
+generated.
+
+Replicas are probed every `REPLICA_HEALTH_CHECK_INTERVAL` seconds by a
+background thread in each process, never by a request. One that is more than
+`REPLICA_MAX_LAG` seconds behind (or can't be reached) is skipped until it
+catches up. Until the first probe has finished, reads go to the primary.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import SAFE_METHODS
+
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = "use_primary"
+
+_use_primary = ContextVar("use_primary", default=False)
+
+_health = {"pid": None, "healthy": []}
+_health_lock = threading.Lock()
+
+
+def replica_lag(alias):
+    """How many seconds behind the primary a replica is."""
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT CASE
+                WHEN NOT pg_is_in_recovery()
+                    OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+                THEN 0
+                ELSE COALESCE(
+                    EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+                )
+            END
+            """
+        )
+        return float(cursor.fetchone()[0])
+
+
+def check_replicas():
+    """Probe every replica and return a dict of alias to lag (None if down)."""
+    results = {}
+    for alias in settings.DATABASE_REPLICAS:
+        try:
+            results[alias] = replica_lag(alias)
+        except Exception:
+            logger.exception("Replica %s failed its health check", alias)
+            results[alias] = None
+    return results
+
+
+def refresh_health():
+    """Probe the replicas and update the ones that reads are sent to."""
+    _health["healthy"] = [
+        alias
+        for alias, lag in check_replicas().items()
+        if lag is not None and lag <= settings.REPLICA_MAX_LAG
+    ]
+
+
+def _check_health_forever():
+    while True:
+        try:
+            refresh_health()
+        except Exception:
+            logger.exception("Replica health check failed")
+        finally:
+            # The probe connections belong to this thread; don't hold them open.
+            connections.close_all()
+        time.sleep(settings.REPLICA_HEALTH_CHECK_INTERVAL)
+
+
+def start_health_checks():
+    """Start probing the replicas in the background, once per process."""
+    with _health_lock:
+        # A forked process (e.g. a gunicorn worker) needs its own thread.
+        if _health["pid"] == os.getpid():
+            return
+        _health["pid"] = os.getpid()
+    threading.Thread(
+        target=_check_health_forever, name="replica-health-checks", daemon=True
+    ).start()
+
+
+def healthy_replicas():
+    start_health_checks()
+    return _health["healthy"]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or _use_primary.get():
+            return None
+        # The database cache must see its invalidations at once.
+        if model._meta.app_label == "django_cache":
+            return None
+        # Reads inside a transaction on the primary must see its own writes.
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        replicas = healthy_replicas()
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def sticky_key(user_id):
+    return f"use_primary:{user_id}"
+
+
+def request_user_id(request):
+    """The id of the user making a request, from its API token or its session."""
+    keyword, _, key = request.headers.get("Authorization", "").partition(" ")
+    if keyword == "Token" and key.strip():
+        return (
+            Token.objects.filter(key=key.strip())
+            .values_list("user_id", flat=True)
+            .first()
+        )
+    user = getattr(request, "user", None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+def _stream_with(content, use_primary):
+    # Streamed content is generated after the middleware has returned.
+    iterator = iter(content)
+    while True:
+        token = _use_primary.set(use_primary)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _use_primary.reset(token)
+        yield chunk
+
+
+class ReplicaStickinessMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        writing = request.method not in SAFE_METHODS
+        use_primary = writing or STICKY_COOKIE in request.COOKIES
+        if not use_primary:
+            user_id = request_user_id(request)
+            use_primary = user_id is not None and bool(cache.get(sticky_key(user_id)))
+
+        token = _use_primary.set(use_primary)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_primary.reset(token)
+
+        if response.streaming and not response.is_async:
+            response.streaming_content = _stream_with(
+                response.streaming_content, use_primary
+            )
+        if writing:
+            # DRF sets `request.user` for token clients too once it has
+            # authenticated them.
+            user = getattr(request, "user", None)
+            if user is not None and user.is_authenticated:
+                cache.set(sticky_key(user.pk), True, settings.REPLICA_STICKY_SECONDS)
+            else:
+                response.set_cookie(
+                    STICKY_COOKIE,
+                    "1",
+                    max_age=settings.REPLICA_STICKY_SECONDS,
+                    secure=request.is_secure(),
+                    httponly=True,
+                    samesite="Lax",
+                )
+        return response
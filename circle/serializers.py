@@ -1,19 +1,49 @@
+from django.conf import settings
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 
-from .models import Circle, CircleInvitation, CircleMembership, Post, User
+from .models import (
+    Circle,
+    CircleInvitation,
+    CircleMembership,
+    CircleRole,
+    DataExport,
+    Post,
+    User,
+)
+from .rendering import RENDERER_VERSION, render_markdown
 
 
 class CircleSerializer(serializers.HyperlinkedModelSerializer):
     members = serializers.SlugRelatedField(slug_field="name", read_only=True, many=True)
     role = serializers.SerializerMethodField()
+    unread_count = serializers.SerializerMethodField()
+
+    def get_membership(self, obj):
+        """
+        The current user's role and unread count, from the queryset's
+        `user_role` and `user_unread_count` annotations if it has them.
+        """
+        if hasattr(obj, "user_role"):
+            return obj.user_role, obj.user_unread_count
+        # Lists of posts repeat the same few circles, so remember each membership.
+        memberships = self.context.setdefault("circle_memberships", {})
+        if obj.pk not in memberships:
+            user = self.context["request"].user
+            memberships[obj.pk] = obj.memberships.values_list(
+                "role", "unread_count"
+            ).get(user=user)
+        return memberships[obj.pk]
 
     def get_role(self, obj):
-        user = self.context["request"].user
-        return obj.memberships.get(user=user).role
+        return self.get_membership(obj)[0]
+
+    def get_unread_count(self, obj):
+        return self.get_membership(obj)[1]
 
     class Meta:
         model = Circle
-        fields = ["pk", "url", "name", "members", "role"]
+        fields = ["pk", "url", "name", "members", "role", "unread_count"]
 
 
 class PostInSerializer(serializers.HyperlinkedModelSerializer):
@@ -22,13 +52,33 @@ class PostInSerializer(serializers.HyperlinkedModelSerializer):
         fields = ["url", "circle", "body"]
 
 
+class CirclePkField(serializers.HyperlinkedRelatedField):
+    """Resolves a circle's URL to its primary key without loading the circle."""
+
+    def get_object(self, view_name, view_args, view_kwargs):
+        return int(view_kwargs[self.lookup_url_kwarg])
+
+
+class PostBatchItemSerializer(serializers.Serializer):
+    circle = CirclePkField(view_name="circle-detail", queryset=Circle.objects.all())
+    body = serializers.CharField()
+    idempotency_key = serializers.CharField(max_length=64, required=False)
+
+
 class PostOutSerializer(serializers.HyperlinkedModelSerializer):
     circle = CircleSerializer()
     author = serializers.SlugRelatedField(slug_field="name", read_only=True)
+    body_html = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ["url", "author", "circle", "body", "image", "posted_at"]
+        fields = ["url", "author", "circle", "body", "body_html", "image", "posted_at"]
+
+    def get_body_html(self, obj):
+        # Posts rendered by an older renderer, until `rerender_posts` catches up.
+        if obj.body_html_version != RENDERER_VERSION:
+            return render_markdown(obj.body)
+        return obj.body_html
 
 
 class CircleInvitationSerializer(serializers.HyperlinkedModelSerializer):
@@ -41,6 +91,20 @@ class CircleInvitationSerializer(serializers.HyperlinkedModelSerializer):
         fields = ["url", "invitee", "circle", "role"]
 
 
+class CircleInvitationBulkSerializer(serializers.Serializer):
+    circle = serializers.HyperlinkedRelatedField(
+        view_name="circle-detail", queryset=Circle.objects.all()
+    )
+    invitees = serializers.ListField(
+        child=serializers.EmailField(),
+        allow_empty=False,
+        max_length=settings.MAX_BULK_INVITATIONS,
+    )
+    role = serializers.ChoiceField(
+        choices=CircleRole.choices, default=CircleRole.MEMBER
+    )
+
+
 def is_true(value):
     if not value:
         raise serializers.ValidationError("This field must be true.")
@@ -48,3 +112,17 @@ def is_true(value):
 
 class CircleInvitationAcceptSerializer(serializers.Serializer):
     accepted = serializers.BooleanField(validators=[is_true])
+
+
+class DataExportSerializer(serializers.HyperlinkedModelSerializer):
+    downloads = serializers.SerializerMethodField()
+
+    def get_downloads(self, obj):
+        url = reverse(
+            "dataexport-download", kwargs={"pk": obj.pk}, request=self.context["request"]
+        )
+        return [f"{url}?part={number}" for number in range(1, len(obj.parts) + 1)]
+
+    class Meta:
+        model = DataExport
+        fields = ["url", "status", "created_at", "finished_at", "downloads"]
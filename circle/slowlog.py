@@ -0,0 +1,217 @@
+"""
+Slow query log.
+
+`SlowQueryMiddleware` times every query made while handling a request (and
+`slow_query_logging` can be used to do the same anywhere else, as the job worker
+does). Queries slower than `SLOW_QUERY_THRESHOLD_MS` are written to the
+`circle.slowlog` logger as one JSON object per line with:
+
+- the SQL, normalized so that the same query with different values groups together
+- where it came from: the view and serializer methods on the stack, and the
+  innermost line of project code
+- the database's plan for it (`EXPLAIN`). A fraction of slow SELECTs on
+  PostgreSQL, `SLOW_QUERY_ANALYZE_SAMPLE_RATE`, are run again with
+  `EXPLAIN ANALYZE` to get actual row counts and timings.
+
+In settings, that logger appends to `SLOW_QUERY_LOG_FILE`, which is rotated from
+outside (see `SLOW_QUERY_LOG_BACKUPS`). `top_slow_queries` reads it back to
+aggregate the worst offenders for the staff-only `/slow-queries/` endpoint.
+"""
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework.serializers import BaseSerializer
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_SAVEPOINT = "slowlog_explain"
+
+
+def normalize_sql(sql):
+    sql = sql.replace("%s", "?")
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    return " ".join(sql.split())
+
+
+def _is_project_file(filename):
+    return (
+        filename.startswith(str(settings.BASE_DIR))
+        and "site-packages" not in filename
+    )
+
+
+def call_site():
+    """Describe where in the project the current query was made from."""
+    view = serializer = location = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        # type() rather than isinstance(), which would evaluate lazy objects
+        # such as request.user and run a query from inside this one.
+        instance = frame.f_locals.get("self")
+        cls = type(instance)
+        if view is None and issubclass(cls, APIView):
+            # A viewset's action, rather than whichever helper it called
+            handler = getattr(instance, "action", None) or code.co_name
+            view = f"{cls.__name__}.{handler}"
+        if serializer is None and issubclass(cls, BaseSerializer):
+            serializer = f"{cls.__name__}.{code.co_name}"
+        if (
+            location is None
+            and code.co_filename != __file__
+            and _is_project_file(code.co_filename)
+        ):
+            filename = os.path.relpath(code.co_filename, settings.BASE_DIR)
+            location = f"{filename}:{frame.f_lineno} in {code.co_name}"
+        frame = frame.f_back
+    return {"view": view, "serializer": serializer, "location": location}
+
+
+def explain(connection, sql, params, analyze=False):
+    """Return the query plan for `sql` as text, or None if it can't be explained."""
+    if connection.vendor == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS)" if analyze else "EXPLAIN"
+    elif connection.vendor == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN"
+    elif connection.vendor == "mysql":
+        prefix = "EXPLAIN"
+    else:
+        return None
+
+    # A bare backend cursor skips the execute wrappers, so this query isn't
+    # timed and logged itself.
+    cursor = connection.create_cursor()
+    # On PostgreSQL a failed statement aborts the whole transaction, so inside
+    # one the EXPLAIN gets a savepoint to roll back to.
+    savepoint = connection.in_atomic_block and connection.features.uses_savepoints
+    try:
+        if savepoint:
+            cursor.execute(connection.ops.savepoint_create_sql(_SAVEPOINT))
+        cursor.execute(f"{prefix} {sql}", params)
+        rows = cursor.fetchall()
+    except Exception:
+        if savepoint:
+            cursor.execute(connection.ops.savepoint_rollback_sql(_SAVEPOINT))
+        return None
+    else:
+        if savepoint:
+            cursor.execute(connection.ops.savepoint_commit_sql(_SAVEPOINT))
+    finally:
+        cursor.close()
+    return "\n".join(" ".join(str(column) for column in row) for row in rows)
+
+
+class SlowQueryLogger:
+    """A database execute wrapper that logs queries slower than the threshold."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = (time.perf_counter() - start) * 1000
+        if duration >= settings.SLOW_QUERY_THRESHOLD_MS:
+            self.record(sql, params, many, duration)
+        return result
+
+    def record(self, sql, params, many, duration):
+        entry = {
+            "time": timezone.now().isoformat(),
+            "database": self.connection.alias,
+            "duration_ms": round(duration, 2),
+            "sql": normalize_sql(sql),
+            **call_site(),
+            "plan": None,
+            "analyzed": False,
+        }
+        if (
+            settings.SLOW_QUERY_EXPLAIN
+            and not many
+            and sql.lstrip()[:6].upper() == "SELECT"
+        ):
+            analyze = (
+                self.connection.vendor == "postgresql"
+                and random.random() < settings.SLOW_QUERY_ANALYZE_SAMPLE_RATE
+            )
+            entry["plan"] = explain(self.connection, sql, params, analyze=analyze)
+            entry["analyzed"] = analyze and entry["plan"] is not None
+        logger.warning(json.dumps(entry))
+
+
+@contextmanager
+def slow_query_logging():
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(SlowQueryLogger(connection)))
+        yield
+
+
+class SlowQueryMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with slow_query_logging():
+            return self.get_response(request)
+
+
+def _log_entries():
+    path = settings.SLOW_QUERY_LOG_FILE
+    # Oldest rotated file first, so the latest sample of each query wins.
+    paths = [f"{path}.{n}" for n in range(settings.SLOW_QUERY_LOG_BACKUPS, 0, -1)]
+    for name in paths + [str(path)]:
+        try:
+            with open(name) as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            continue
+
+
+def top_slow_queries(limit=20, order_by="total_ms"):
+    """Aggregate the slow query log by normalized SQL."""
+    stats = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+    for entry in _log_entries():
+        query = stats[entry["sql"]]
+        query["count"] += 1
+        query["total_ms"] += entry["duration_ms"]
+        query["max_ms"] = max(query["max_ms"], entry["duration_ms"])
+        query["last_seen"] = entry["time"]
+        query["view"] = entry.get("view")
+        query["serializer"] = entry.get("serializer")
+        query["location"] = entry.get("location")
+        if entry.get("plan"):
+            query["plan"] = entry["plan"]
+            query["analyzed"] = entry.get("analyzed", False)
+
+    results = [
+        {
+            "sql": sql,
+            **query,
+            "total_ms": round(query["total_ms"], 2),
+            "mean_ms": round(query["total_ms"] / query["count"], 2),
+        }
+        for sql, query in stats.items()
+    ]
+    results.sort(key=lambda query: query[order_by], reverse=True)
+    return results[:limit]
@@ -0,0 +1,40 @@
+"""
+Storage for files that must never be public: data exports and post archives.
+
+They go to the `private` storage in `STORAGES` rather than the default one, and
+are only ever read back through the API (e.g. /exports/<pk>/download/), which
+checks who is asking. Locally that is `PRIVATE_MEDIA_ROOT`, outside
+`MEDIA_ROOT`; with S3 it is the same bucket under `private/`, with a private
+ACL.
+"""
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, storages
+from django.utils.functional import LazyObject, cached_property
+
+
+class PrivateFileSystemStorage(FileSystemStorage):
+    """A FileSystemStorage in `PRIVATE_MEDIA_ROOT`, with no URL to serve it at."""
+
+    def __init__(self, location=None, **kwargs):
+        super().__init__(location=location, base_url=None, **kwargs)
+
+    @cached_property
+    def base_location(self):
+        return self._value_or_setting(self._location, settings.PRIVATE_MEDIA_ROOT)
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        super()._clear_cached_properties(setting, **kwargs)
+        if setting == "PRIVATE_MEDIA_ROOT":
+            self.__dict__.pop("base_location", None)
+            self.__dict__.pop("location", None)
+
+    def url(self, name):
+        raise ValueError("Private files have no public URL.")
+
+
+class PrivateStorage(LazyObject):
+    def _setup(self):
+        self._wrapped = storages["private"]
+
+
+private_storage = PrivateStorage()
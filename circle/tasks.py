@@ -0,0 +1,20 @@
+"""
+Functions run by background workers. Queue them with `circle.jobs.enqueue`, e.g.
+
+    enqueue("circle.tasks.export_user_data", export.pk)
+"""
+from circle import exports, purge
+from circle.models import DataExport
+
+
+def export_user_data(export_pk):
+    export = DataExport.objects.select_related("user").get(pk=export_pk)
+    exports.run_export(export)
+
+
+def purge_circle(circle_pk):
+    purge.purge_circle(circle_pk)
+
+
+def purge_user(user_pk):
+    purge.purge_user(user_pk)
@@ -0,0 +1,32 @@
+"""
+Large datasets for tests, built with a few bulk inserts.
+
+Build them in `setUpTestData`: each test class then builds its dataset once, and
+every test starts from it unchanged, as Django rolls each test back to the state
+right after `setUpTestData`.
+"""
+from types import SimpleNamespace
+
+from circle.models import Post
+
+from .factories import CircleFactory, UserFactory
+
+
+def large_circle(members=1000, posts=0, name="Big Circle"):
+    """
+    A circle with an owner, `members` members and `posts` posts by the members.
+    """
+    owner = UserFactory(name="Owner")
+    users = UserFactory.create_bulk(members)
+    circle = CircleFactory(name=name, owners=[owner], members=users)
+    new_posts = []
+    for n in range(posts):
+        post = Post(author=users[n % members], circle=circle, body=f"Post {n}")
+        post.render_body()
+        new_posts.append(post)
+    return SimpleNamespace(
+        owner=owner,
+        members=users,
+        circle=circle,
+        posts=Post.objects.bulk_create(new_posts),
+    )
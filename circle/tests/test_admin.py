@@ -0,0 +1,87 @@
+from circle.models import Circle, Job, Post, User
+from django.test import TestCase
+
+from .factories import CircleFactory, UserFactory
+
+
+class AdminTest(TestCase):
+    def setUp(self):
+        self.admin = UserFactory(is_staff=True, is_superuser=True)
+        self.user = UserFactory()
+        self.circle = CircleFactory(owners=[self.user])
+        self.post = Post.objects.create(author=self.user, circle=self.circle, body="Hi")
+        self.client.login(email=self.admin.email, password="testpassword")
+
+    def test_changelists_load(self):
+        for model in ["user", "circle", "circlemembership", "circleinvitation", "post"]:
+            with self.subTest(model=model):
+                response = self.client.get(f"/admin/circle/{model}/")
+                self.assertEqual(response.status_code, 200)
+
+    def test_post_changelist_does_not_query_per_row(self):
+        for _ in range(5):
+            Post.objects.create(author=self.user, circle=self.circle, body="Hi")
+        self.client.get("/admin/circle/post/")
+
+        with self.assertNumQueries(4):
+            self.client.get("/admin/circle/post/")
+
+    def test_search_matches_exact_values(self):
+        response = self.client.get("/admin/circle/post/", {"q": self.user.email})
+        self.assertEqual(list(response.context["cl"].result_list), [self.post])
+
+        response = self.client.get("/admin/circle/post/", {"q": self.user.email[:4]})
+        self.assertEqual(list(response.context["cl"].result_list), [])
+
+    def test_search_skips_fields_the_term_cannot_match(self):
+        response = self.client.get("/admin/circle/circle/", {"q": "not a number"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["cl"].result_list), [])
+
+    def test_user_can_be_added(self):
+        response = self.client.post(
+            "/admin/circle/user/add/",
+            {
+                "email": "new@example.org",
+                "name": "New",
+                "date_of_birth": "2000-01-01",
+                "password1": "a-long-password-1",
+                "password2": "a-long-password-1",
+            },
+        )
+
+        self.assertEqual(response.status_code, 302)
+
+    def test_deleting_a_circle_soft_deletes_it(self):
+        response = self.client.get(f"/admin/circle/circle/{self.circle.pk}/delete/")
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(
+            f"/admin/circle/circle/{self.circle.pk}/delete/", {"post": "yes"}
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertIsNotNone(Circle.objects.get(pk=self.circle.pk).deleted_at)
+        self.assertTrue(Post.objects.filter(pk=self.post.pk).exists())
+        self.assertEqual(
+            list(Job.objects.values_list("task", "args")),
+            [("circle.tasks.purge_circle", [self.circle.pk])],
+        )
+
+    def test_deleting_selected_users_soft_deletes_them(self):
+        response = self.client.post(
+            "/admin/circle/user/",
+            {
+                "action": "delete_selected",
+                "_selected_action": [self.user.pk],
+                "post": "yes",
+            },
+        )
+
+        self.assertEqual(response.status_code, 302)
+        user = User.objects.get(pk=self.user.pk)
+        self.assertFalse(user.is_active)
+        self.assertIsNotNone(user.deleted_at)
+        tasks = list(Job.objects.values_list("task", flat=True))
+        self.assertEqual(tasks, ["circle.tasks.purge_user"])
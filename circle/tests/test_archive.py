@@ -0,0 +1,158 @@
+import datetime
+import io
+
+from circle import archive
+from circle.models import Post, PostArchive
+from circle.archive import add_months, month_start
+from circle.purge import purge_circle, purge_user
+from circle.storage import private_storage
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from .factories import CircleFactory, UserFactory
+from .util import TempMediaMixin
+
+
+def days_ago(days):
+    return timezone.now() - datetime.timedelta(days=days)
+
+
+@override_settings(POST_HOT_DAYS=30)
+class ArchiveTest(TempMediaMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = UserFactory(name="Me")
+        self.friend = UserFactory(name="Friend")
+        self.circle = CircleFactory(owners=[self.user], members=[self.friend])
+        self.posts = []
+        for n, days in enumerate([1, 40, 80, 200]):
+            author = self.friend if n == 2 else self.user
+            post = Post.objects.create(
+                author=author, circle=self.circle, body=f"Post {n}"
+            )
+            Post.objects.filter(pk=post.pk).update(posted_at=days_ago(days))
+            self.posts.append(post)
+        self.client.login(email=self.user.email, password="testpassword")
+
+    def history(self, **params):
+        return self.client.get(
+            "/posts/history/", {"circle": self.circle.pk, **params}
+        ).data
+
+    def test_feed_has_old_posts_until_they_are_archived(self):
+        bodies = [post["body"] for post in self.client.get("/posts/").data["results"]]
+        self.assertEqual(bodies, ["Post 0", "Post 1", "Post 2", "Post 3"])
+
+        archive.archive_posts(days_ago(30))
+
+        bodies = [post["body"] for post in self.client.get("/posts/").data["results"]]
+        self.assertEqual(bodies, ["Post 0"])
+
+    def test_history_has_older_posts(self):
+        data = self.history(before=days_ago(30).isoformat())
+
+        self.assertEqual(
+            [post["body"] for post in data["results"]], ["Post 1", "Post 2", "Post 3"]
+        )
+        self.assertEqual(data["results"][1]["author"], "Friend")
+        self.assertFalse(data["results"][0]["archived"])
+
+    def test_archived_posts_are_read_through(self):
+        call_command("archive_posts", stdout=io.StringIO())
+
+        self.assertEqual(list(Post.objects.values_list("body", flat=True)), ["Post 0"])
+        self.assertEqual(PostArchive.objects.filter(circle=self.circle).count(), 3)
+
+        first = self.history(limit=3)
+        bodies = [p["body"] for p in first["results"]]
+        self.assertEqual(bodies, ["Post 0", "Post 1", "Post 2"])
+        self.assertEqual([p["archived"] for p in first["results"]], [False, True, True])
+
+        second = self.client.get(first["next"]).data
+        self.assertEqual([p["body"] for p in second["results"]], ["Post 3"])
+        self.assertIsNone(second["next"])
+
+    def test_history_pages_through_posts_from_the_same_moment(self):
+        moment = days_ago(50)
+        for n in range(3):
+            Post.objects.create(author=self.user, circle=self.circle, body=f"Same {n}")
+        Post.objects.filter(body__startswith="Same").update(posted_at=moment)
+        archive.archive_posts(days_ago(45))
+        Post.objects.create(author=self.user, circle=self.circle, body="Same 3")
+        Post.objects.filter(body="Same 3").update(posted_at=moment)
+
+        bodies = []
+        data = self.history(before=days_ago(45).isoformat(), limit=2)
+        while True:
+            bodies += [post["body"] for post in data["results"]]
+            if data["next"] is None:
+                break
+            data = self.client.get(data["next"]).data
+
+        self.assertEqual(
+            bodies, ["Same 3", "Same 2", "Same 1", "Same 0", "Post 2", "Post 3"]
+        )
+
+    def test_archives_are_kept_out_of_public_media(self):
+        archive.archive_posts(days_ago(30))
+
+        for name in PostArchive.objects.values_list("file", flat=True):
+            self.assertTrue(private_storage.exists(name))
+            self.assertFalse(default_storage.exists(name))
+
+    def test_archiving_a_month_again_keeps_its_posts(self):
+        archive.archive_posts(days_ago(100))
+        month = month_start(days_ago(200))
+        Post.objects.create(author=self.user, circle=self.circle, body="Late")
+        Post.objects.filter(body="Late").update(posted_at=days_ago(200))
+
+        archive.archive_posts(days_ago(100))
+
+        stored = PostArchive.objects.get(circle=self.circle, month=month)
+        self.assertEqual(stored.post_count, 2)
+        bodies = {record["body"] for record in archive.read_archive(stored)}
+        self.assertEqual(bodies, {"Post 3", "Late"})
+
+    def test_purging_a_user_removes_their_archived_posts(self):
+        archive.archive_posts(days_ago(30))
+        self.friend.soft_delete()
+
+        purge_user(self.friend.pk)
+
+        bodies = [p["body"] for p in self.history()["results"]]
+        self.assertEqual(bodies, ["Post 0", "Post 1", "Post 3"])
+        # That month only had their post.
+        self.assertFalse(
+            PostArchive.objects.filter(month=month_start(days_ago(80))).exists()
+        )
+
+    def test_purging_a_circle_removes_its_archives(self):
+        archive.archive_posts(days_ago(30))
+        files = list(PostArchive.objects.values_list("file", flat=True))
+        self.circle.soft_delete()
+
+        purge_circle(self.circle.pk)
+
+        self.assertFalse(PostArchive.objects.exists())
+        self.assertFalse(any(private_storage.exists(name) for name in files))
+
+    def test_history_is_only_for_members(self):
+        other = UserFactory()
+        self.client.login(email=other.email, password="testpassword")
+
+        response = self.client.get("/posts/history/", {"circle": self.circle.pk})
+
+        self.assertEqual(response.status_code, 404)
+
+
+class AddMonthsTest(TestCase):
+    def test_add_months_wraps_years(self):
+        self.assertEqual(
+            add_months(datetime.date(2026, 11, 1), 3), datetime.date(2027, 2, 1)
+        )
+        self.assertEqual(
+            add_months(datetime.date(2026, 1, 1), -1), datetime.date(2025, 12, 1)
+        )
@@ -0,0 +1,84 @@
+from circle.models import Post
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from .factories import CircleFactory, UserFactory
+from .test_events import RecordingBroker
+from .util import url
+
+
+class BatchCreatePostsTest(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.circle = CircleFactory(owners=[self.user])
+        self.other_circle = CircleFactory(owners=[UserFactory()])
+        self.client.login(email=self.user.email, password="testpassword")
+
+    def post_batch(self, posts):
+        return self.client.post("/posts/batch/", {"posts": posts}, format="json")
+
+    def test_posts_are_created_with_per_item_results(self):
+        circle_url = url("circle-detail", pk=self.circle.pk)
+
+        response = self.post_batch(
+            [
+                {"circle": circle_url, "body": "First", "idempotency_key": "a"},
+                {"circle": circle_url, "body": "*Second*"},
+                {"circle": url("circle-detail", pk=self.other_circle.pk), "body": "No"},
+                {"circle": circle_url},
+            ]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data["results"]
+        self.assertEqual([result["status"] for result in results], [201, 201, 403, 400])
+        self.assertIn("body", results[3]["errors"])
+        second = Post.objects.get(pk=results[1]["pk"])
+        self.assertEqual(second.author, self.user)
+        self.assertEqual(second.body_html, "<p><em>Second</em></p>")
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_retried_batch_does_not_duplicate_posts(self):
+        circle_url = url("circle-detail", pk=self.circle.pk)
+        batch = [
+            {"circle": circle_url, "body": "Once", "idempotency_key": "k1"},
+            {"circle": circle_url, "body": "Once", "idempotency_key": "k1"},
+        ]
+
+        first = self.post_batch(batch)
+        second = self.post_batch(batch)
+
+        self.assertEqual(Post.objects.count(), 1)
+        post = Post.objects.get()
+        self.assertEqual(
+            [result["status"] for result in first.data["results"]], [201, 200]
+        )
+        self.assertEqual(
+            [result["pk"] for result in second.data["results"]], [post.pk, post.pk]
+        )
+
+    def test_empty_batch_is_rejected(self):
+        self.assertEqual(self.post_batch([]).status_code, 400)
+
+    @override_settings(EVENTS_BROKER="circle.tests.test_events.RecordingBroker")
+    def test_events_for_a_batch_look_up_members_once(self):
+        RecordingBroker.published.clear()
+        member = UserFactory()
+        second_circle = CircleFactory(owners=[self.user], members=[member])
+        batch = [
+            {"circle": url("circle-detail", pk=circle.pk), "body": f"Post {n}"}
+            for n in range(20)
+            for circle in (self.circle, second_circle)
+        ]
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.post_batch(batch)
+        with self.assertNumQueries(1):
+            for callback in callbacks:
+                callback()
+
+        self.assertEqual(len(RecordingBroker.published), 40)
+        audiences = {frozenset(event[0]) for event in RecordingBroker.published}
+        self.assertEqual(
+            audiences, {frozenset([self.user.pk]), frozenset([self.user.pk, member.pk])}
+        )
@@ -0,0 +1,90 @@
+from circle.models import CircleInvitation, CircleRole
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from .factories import CircleFactory, UserFactory
+
+
+class DirectoryTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = UserFactory(name="Me")
+        self.alice = UserFactory(name="Alice")
+        self.bob = UserFactory(name="Bob")
+        self.family = CircleFactory(
+            name="Family", owners=[self.user], members=[self.alice, self.bob]
+        )
+        self.work = CircleFactory(name="Work", owners=[self.alice], members=[self.user])
+        CircleFactory(name="Elsewhere", owners=[UserFactory()])
+        self.client.login(email=self.user.email, password="testpassword")
+
+    def test_each_co_member_is_listed_once_with_shared_circles(self):
+        with self.assertNumQueries(3):  # session, user, directory
+            response = self.client.get("/directory/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(
+            response.data["results"],
+            [
+                {
+                    "id": self.alice.pk,
+                    "name": "Alice",
+                    "circles": [
+                        {"id": self.family.pk, "name": "Family"},
+                        {"id": self.work.pk, "name": "Work"},
+                    ],
+                },
+                {
+                    "id": self.bob.pk,
+                    "name": "Bob",
+                    "circles": [{"id": self.family.pk, "name": "Family"}],
+                },
+            ],
+        )
+
+    def test_directory_is_cached(self):
+        self.client.get("/directory/")
+
+        with self.assertNumQueries(2):
+            response = self.client.get("/directory/")
+        self.assertEqual(response.data["count"], 2)
+
+    def test_directory_is_paginated(self):
+        response = self.client.get("/directory/?page_size=1&page=2")
+
+        names = [person["name"] for person in response.data["results"]]
+        self.assertEqual(names, ["Bob"])
+
+    def test_accepting_an_invitation_updates_directories(self):
+        self.client.get("/directory/")
+        carol = UserFactory(name="Carol")
+        invitation = CircleInvitation.objects.create(
+            invitee=carol, circle=self.family, role=CircleRole.MEMBER
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invitation.accept()
+
+        response = self.client.get("/directory/")
+        self.assertIn("Carol", [person["name"] for person in response.data["results"]])
+
+    def test_deleted_circles_and_users_drop_out(self):
+        self.client.get("/directory/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob.soft_delete()
+            self.work.soft_delete()
+
+        response = self.client.get("/directory/")
+        self.assertEqual(
+            response.data["results"],
+            [
+                {
+                    "id": self.alice.pk,
+                    "name": "Alice",
+                    "circles": [{"id": self.family.pk, "name": "Family"}],
+                }
+            ],
+        )
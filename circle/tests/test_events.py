@@ -0,0 +1,127 @@
+import asyncio
+import json
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from circle import events
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from .factories import CircleFactory, UserFactory
+from .util import url
+
+
+class RecordingBroker:
+    published = []
+
+    def publish(self, user_ids, event_type, data):
+        self.published.append((set(user_ids), event_type, data))
+
+
+@override_settings(EVENTS_BROKER="circle.tests.test_events.RecordingBroker")
+class PublishEventsTest(APITestCase):
+    def setUp(self):
+        RecordingBroker.published.clear()
+        self.author = UserFactory()
+        self.member = UserFactory()
+        self.outsider = UserFactory()
+        self.circle = CircleFactory(owners=[self.author], members=[self.member])
+
+    def test_new_post_is_published_to_circle_members(self):
+        self.client.login(email=self.author.email, password="testpassword")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/posts/",
+                {"circle": url("circle-detail", pk=self.circle.pk), "body": "Hi"},
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, 201)
+        user_ids, event_type, data = RecordingBroker.published[0]
+        self.assertEqual(event_type, events.POST_CREATED)
+        self.assertEqual(user_ids, {self.author.pk, self.member.pk})
+        self.assertEqual(data["circle"], self.circle.pk)
+
+    def test_new_invitation_is_published_to_invitee(self):
+        self.client.login(email=self.author.email, password="testpassword")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/invitations/",
+                {
+                    "circle": url("circle-detail", pk=self.circle.pk),
+                    "invitee": self.outsider.email,
+                },
+            )
+
+        user_ids, event_type, _ = RecordingBroker.published[0]
+        self.assertEqual(event_type, events.INVITATION_CREATED)
+        self.assertIn(self.outsider.pk, user_ids)
+
+
+class EventStreamTest(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.token = Token.objects.create(user=self.user)
+
+    def stream(self, scope, on_start=None):
+        sent = []
+
+        async def run():
+            done = asyncio.Event()
+
+            async def receive():
+                await done.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                sent.append(message)
+                if message["type"] == "http.response.start" and on_start:
+                    on_start()
+                elif message.get("body"):
+                    done.set()
+
+            await events.event_stream(scope, receive, send)
+
+        async_to_sync(run)()
+        return sent
+
+    def test_missing_token_is_rejected(self):
+        sent = self.stream({"type": "http", "path": "/events/", "headers": []})
+
+        self.assertEqual(sent[0]["status"], 401)
+
+    def test_events_are_delivered_to_subscriber(self):
+        def publish():
+            events.get_broker().publish([self.user.pk], events.POST_CREATED, {"pk": 1})
+
+        sent = self.stream(
+            {
+                "type": "http",
+                "path": "/events/",
+                "headers": [(b"authorization", f"Token {self.token.key}".encode())],
+            },
+            on_start=publish,
+        )
+
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertIn(b"event: post.created", sent[1]["body"])
+        self.assertIn(b'data: {"pk": 1}', sent[1]["body"])
+
+
+class PostgresBrokerTest(TestCase):
+    def test_large_audiences_are_split_across_notifications(self):
+        broker = events.PostgresBroker()
+        cursor = mock.MagicMock()
+
+        with mock.patch.object(events.connection, "cursor") as get_cursor:
+            get_cursor.return_value.__enter__.return_value = cursor
+            broker.publish(range(1200), events.POST_CREATED, {"pk": 1})
+
+        notified = [c.args[1][1] for c in cursor.execute.call_args_list]
+        payloads = [json.loads(payload) for payload in notified]
+        self.assertEqual([len(p["user_ids"]) for p in payloads], [500, 500, 200])
+        self.assertTrue(all(len(payload) < 8000 for payload in notified))
+        self.assertEqual(payloads[0]["type"], events.POST_CREATED)
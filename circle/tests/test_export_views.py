@@ -0,0 +1,145 @@
+import datetime
+import io
+import json
+import os
+import zipfile
+from unittest import mock
+
+from circle import archive, exports, jobs
+from circle.models import DataExport, Job, JobStatus, Post
+from circle.storage import private_storage
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from .factories import CircleFactory, UserFactory
+from .util import TempMediaMixin
+
+
+@override_settings(EXPORT_POSTS_PER_PART=2)
+class DataExportTest(TempMediaMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = UserFactory()
+        self.circle = CircleFactory(name="Family", owners=[self.user])
+        for n in range(3):
+            Post.objects.create(author=self.user, circle=self.circle, body=f"Post {n}")
+        post = Post.objects.first()
+        post.image.save("photo.jpg", ContentFile(b"image bytes"), save=True)
+        self.client.login(email=self.user.email, password="testpassword")
+
+    def read_part(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+
+    def test_user_can_export_their_data(self):
+        response = self.client.post("/exports/")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["status"], JobStatus.QUEUED)
+
+        jobs.run_pending()
+
+        response = self.client.get(response.data["url"])
+        self.assertEqual(response.data["status"], JobStatus.DONE)
+        self.assertEqual(len(response.data["downloads"]), 2)
+
+        first = self.read_part(response.data["downloads"][0])
+        second = self.read_part(response.data["downloads"][1])
+        circles = json.loads(first.read("circles.json"))
+        self.assertEqual(circles[0]["circle_name"], "Family")
+        posts = [
+            json.loads(line)
+            for part in (first, second)
+            for line in part.read("posts.jsonl").splitlines()
+        ]
+        self.assertEqual([post["body"] for post in posts], ["Post 0", "Post 1", "Post 2"])
+        image = [name for name in first.namelist() if name.startswith("images/")]
+        self.assertEqual(first.read(image[0]), b"image bytes")
+
+    def test_interrupted_export_resumes_after_last_part(self):
+        export = DataExport.objects.create(user=self.user)
+        exports.write_export_part(export)
+
+        exports.run_export(DataExport.objects.get(pk=export.pk))
+
+        export.refresh_from_db()
+        self.assertEqual(len(export.parts), 2)
+        self.assertEqual(export.last_post_id, Post.objects.order_by("pk").last().pk)
+
+    def test_archived_posts_are_exported(self):
+        old = timezone.now() - datetime.timedelta(days=400)
+        Post.objects.filter(body="Post 0").update(posted_at=old)
+        archive.archive_posts(old + datetime.timedelta(days=1))
+        export = DataExport.objects.create(user=self.user)
+
+        exports.run_export(export)
+
+        parts = [zipfile.ZipFile(private_storage.open(name)) for name in export.parts]
+        posts = [
+            json.loads(line)
+            for part in parts
+            for line in part.read("posts.jsonl").splitlines()
+        ]
+        bodies = [post["body"] for post in posts]
+        self.assertEqual(bodies, ["Post 1", "Post 2", "Post 0"])
+        self.assertEqual(posts[2]["circle_name"], "Family")
+        names = [name for part in parts for name in part.namelist()]
+        self.assertEqual(len([n for n in names if n.startswith("images/")]), 1)
+
+    def test_missing_images_are_noted_rather_than_failing_the_export(self):
+        post = Post.objects.exclude(image="").get()
+        default_storage.delete(post.image.name)
+        export = DataExport.objects.create(user=self.user)
+
+        exports.run_export(export)
+
+        self.assertEqual(export.status, JobStatus.DONE)
+        first = zipfile.ZipFile(private_storage.open(export.parts[0]))
+        posts = [json.loads(line) for line in first.read("posts.jsonl").splitlines()]
+        self.assertTrue(posts[0]["image_missing"])
+        self.assertEqual(posts[0]["image"], post.image.name)
+        self.assertNotIn("image_missing", posts[1])
+        self.assertFalse(any(n.startswith("images/") for n in first.namelist()))
+
+    def test_other_users_cannot_see_export(self):
+        export = DataExport.objects.create(user=self.user)
+        self.client.login(email=UserFactory().email, password="testpassword")
+
+        response = self.client.get(f"/exports/{export.pk}/")
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_exports_are_kept_out_of_public_media(self):
+        export = DataExport.objects.create(user=self.user)
+
+        exports.run_export(export)
+
+        path = private_storage.path(export.parts[0])
+        self.assertTrue(path.startswith(self.private_media_root))
+        self.assertTrue(os.path.exists(path))
+        media_path = os.path.join(self.media_root, export.parts[0])
+        self.assertFalse(os.path.exists(media_path))
+
+    def test_export_that_runs_out_of_attempts_fails(self):
+        self.client.post("/exports/")
+        Job.objects.update(max_attempts=1)
+
+        with mock.patch.object(exports, "_copy_image", side_effect=OSError):
+            jobs.run_pending()
+
+        export = DataExport.objects.get()
+        self.assertEqual(export.status, JobStatus.FAILED)
+        response = self.client.post("/exports/")
+        self.assertEqual(response.data["status"], JobStatus.QUEUED)
+        self.assertEqual(DataExport.objects.count(), 2)
+
+    def test_export_is_retried_before_it_fails(self):
+        self.client.post("/exports/")
+
+        with mock.patch.object(exports, "_copy_image", side_effect=OSError):
+            jobs.run_pending()
+
+        self.assertEqual(DataExport.objects.get().status, JobStatus.RUNNING)
@@ -1,7 +1,11 @@
+from unittest import mock
+
 from circle.models import CircleInvitation, CircleRole
+from django.test import override_settings
 from rest_framework.test import APITestCase
 
 from .factories import CircleFactory, CircleInvitationFactory, UserFactory
+from .test_events import RecordingBroker
 from .util import url
 
 
@@ -110,6 +114,130 @@ class CreateInvitationsTest(APITestCase):
         self.assertEqual(response.status_code, 403)
 
 
+class BulkCreateInvitationsTest(APITestCase):
+    def setUp(self):
+        self.owner = UserFactory()
+        self.member = UserFactory()
+        self.circle = CircleFactory(owners=[self.owner], members=[self.member])
+        self.already_invited = CircleInvitationFactory(circle=self.circle).invitee
+
+    def test_owner_can_invite_many_people(self):
+        self.client.login(email=self.owner.email, password="testpassword")
+        new_users = [UserFactory(), UserFactory()]
+        emails = [user.email for user in new_users] + [
+            self.member.email,
+            self.already_invited.email,
+            "nobody@example.org",
+        ]
+
+        with self.assertNumQueries(8):
+            response = self.client.post(
+                "/invitations/",
+                {
+                    "circle": url("circle-detail", pk=self.circle.pk),
+                    "invitees": emails,
+                    "role": CircleRole.ADMIN,
+                },
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [result["result"] for result in response.data["results"]],
+            [
+                "invited",
+                "invited",
+                "already_member",
+                "already_invited",
+                "unknown_user",
+            ],
+        )
+        self.assertEqual(
+            CircleInvitation.objects.filter(
+                circle=self.circle, invitee__in=new_users, role=CircleRole.ADMIN
+            ).count(),
+            2,
+        )
+
+    @override_settings(EVENTS_BROKER="circle.tests.test_events.RecordingBroker")
+    def test_events_for_many_invitations_look_up_members_once(self):
+        RecordingBroker.published.clear()
+        self.client.login(email=self.owner.email, password="testpassword")
+        new_users = UserFactory.create_batch(20)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.invite([user.email for user in new_users])
+        with self.assertNumQueries(1):
+            for callback in callbacks:
+                callback()
+
+        self.assertEqual(
+            [event[0] for event in RecordingBroker.published],
+            [{self.owner.pk, self.member.pk, user.pk} for user in new_users],
+        )
+
+    def invite(self, emails):
+        return self.client.post(
+            "/invitations/",
+            {"circle": url("circle-detail", pk=self.circle.pk), "invitees": emails},
+            format="json",
+        )
+
+    def test_emails_match_in_any_case(self):
+        self.client.login(email=self.owner.email, password="testpassword")
+        new_user = UserFactory(email="Someone@example.org")
+
+        response = self.invite(["someone@EXAMPLE.org", self.member.email.upper()])
+
+        self.assertEqual(
+            [result["result"] for result in response.data["results"]],
+            ["invited", "already_member"],
+        )
+        self.assertTrue(
+            CircleInvitation.objects.filter(
+                circle=self.circle, invitee=new_user
+            ).exists()
+        )
+
+    def test_invitations_created_meanwhile_are_reported(self):
+        self.client.login(email=self.owner.email, password="testpassword")
+        raced, new_user = UserFactory(), UserFactory()
+        CircleInvitation.objects.create(circle=self.circle, invitee=raced)
+
+        # As if another request invited them after they were looked up.
+        with mock.patch.object(
+            CircleInvitation.objects,
+            "filter",
+            return_value=CircleInvitation.objects.none(),
+        ):
+            response = self.invite([raced.email, new_user.email])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [result["result"] for result in response.data["results"]],
+            ["already_invited", "invited"],
+        )
+        self.assertTrue(
+            CircleInvitation.objects.filter(
+                circle=self.circle, invitee=new_user
+            ).exists()
+        )
+
+    def test_member_cannot_invite_many_people(self):
+        self.client.login(email=self.member.email, password="testpassword")
+
+        response = self.client.post(
+            "/invitations/",
+            {
+                "circle": url("circle-detail", pk=self.circle.pk),
+                "invitees": [UserFactory().email],
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 403)
+
+
 class AcceptInvitationTest(APITestCase):
     def setUp(self):
         self.owner = UserFactory()
@@ -124,13 +252,20 @@ class AcceptInvitationTest(APITestCase):
         )
 
         self.assertEqual(response.status_code, 204)
-        self.assertTrue(
-            CircleInvitation.objects.filter(invitee=self.invitee, circle=self.circle)
-            .get()
-            .accepted
+        self.assertFalse(
+            CircleInvitation.objects.filter(
+                invitee=self.invitee, circle=self.circle
+            ).exists()
         )
         self.assertEqual(self.circle.memberships.filter(user=self.invitee).count(), 1)
 
+    def test_invitation_cannot_be_accepted_twice(self):
+        self.invitation.accept()
+
+        with self.assertRaises(CircleInvitation.DoesNotExist):
+            self.invitation.accept()
+        self.assertEqual(self.circle.memberships.filter(user=self.invitee).count(), 1)
+
     def test_other_user_cannot_accept_invitation(self):
         user = UserFactory()
         self.client.login(email=user.email, password="testpassword")
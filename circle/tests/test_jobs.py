@@ -0,0 +1,139 @@
+from datetime import timedelta
+
+from circle import jobs
+from circle.models import Job, JobStatus
+from django.db import transaction
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+calls = []
+
+
+def record_call(*args, **kwargs):
+    calls.append((args, kwargs))
+
+
+def always_fail():
+    raise RuntimeError("boom")
+
+
+def long_running():
+    # As if this ran for longer than JOB_LOCK_TIMEOUT before reporting progress.
+    Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+    jobs.report_progress(step=1)
+    calls.append(jobs.release_stale_jobs())
+
+
+def taken_over():
+    # As if this run outlived JOB_LOCK_TIMEOUT and another worker claimed the job.
+    Job.objects.update(locked_by="other worker", attempts=F("attempts") + 1)
+
+
+class EnqueueTest(TestCase):
+    def test_job_is_rolled_back_with_its_transaction(self):
+        try:
+            with transaction.atomic():
+                jobs.enqueue("circle.tests.test_jobs.record_call", 1)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertEqual(Job.objects.count(), 0)
+
+    def test_future_jobs_are_not_claimed(self):
+        jobs.enqueue(
+            "circle.tests.test_jobs.record_call",
+            run_at=timezone.now() + timedelta(minutes=5),
+        )
+
+        self.assertEqual(jobs.claim_jobs(10), [])
+
+
+@override_settings(JOB_RETRY_BACKOFF=10, JOB_RETRY_MAX_DELAY=60)
+class RunJobTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_job_runs_with_its_arguments(self):
+        job = jobs.enqueue("circle.tests.test_jobs.record_call", 1, 2, flag=True)
+
+        self.assertEqual(jobs.run_pending(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(calls, [((1, 2), {"flag": True})])
+
+    def test_claimed_job_is_not_claimed_twice(self):
+        jobs.enqueue("circle.tests.test_jobs.record_call")
+
+        self.assertEqual(len(jobs.claim_jobs(10)), 1)
+        self.assertEqual(jobs.claim_jobs(10), [])
+
+    def test_failed_job_is_retried_with_backoff(self):
+        job = jobs.enqueue("circle.tests.test_jobs.always_fail", max_attempts=2)
+
+        jobs.run_pending()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.QUEUED)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=5))
+        self.assertIn("boom", job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        jobs.run_pending()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_late_outcome_does_not_overwrite_a_reclaimed_job(self):
+        job = jobs.enqueue("circle.tests.test_jobs.taken_over")
+
+        [pk] = jobs.claim_jobs(1)
+
+        self.assertIsNone(jobs.run_job(pk))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.RUNNING)
+        self.assertEqual(job.locked_by, "other worker")
+
+    def test_backoff_is_capped(self):
+        self.assertEqual(jobs.backoff(1), 10)
+        self.assertEqual(jobs.backoff(2), 20)
+        self.assertEqual(jobs.backoff(10), 60)
+
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_stale_jobs_are_released(self):
+        job = jobs.enqueue("circle.tests.test_jobs.record_call")
+        jobs.claim_jobs(1)
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(minutes=5)
+        )
+
+        self.assertEqual(jobs.release_stale_jobs(), 1)
+        self.assertEqual(jobs.claim_jobs(1), [job.pk])
+
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_jobs_still_running_are_not_released(self):
+        job = jobs.enqueue("circle.tests.test_jobs.record_call")
+        jobs.claim_jobs(1, worker="this worker")
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(minutes=5)
+        )
+
+        self.assertEqual(jobs.heartbeat([job.pk], worker="other worker"), 0)
+        self.assertEqual(jobs.heartbeat([job.pk], worker="this worker"), 1)
+        self.assertEqual(jobs.release_stale_jobs(), 0)
+
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_reporting_progress_refreshes_the_lock(self):
+        job = jobs.enqueue("circle.tests.test_jobs.long_running")
+
+        jobs.run_pending()
+
+        # Nothing was released while it ran, so its outcome was recorded.
+        self.assertEqual(calls, [0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.DONE)
@@ -0,0 +1,71 @@
+import json
+
+from circle.models import Post
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from .factories import CircleFactory, UserFactory
+
+
+@override_settings(STREAM_CHUNK_SIZE=2)
+class MyPostsTest(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.circle = CircleFactory(owners=[self.user])
+        for n in range(5):
+            Post.objects.create(author=self.user, circle=self.circle, body=f"Post {n}")
+        self.client.login(email=self.user.email, password="testpassword")
+
+    def test_mine_returns_a_list_by_default(self):
+        response = self.client.get("/posts/mine/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(response.data[0]["body"], "Post 4")
+
+    def test_mine_can_be_paginated(self):
+        response = self.client.get("/posts/mine/?page=2&page_size=2")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 5)
+        self.assertEqual(
+            [post["body"] for post in response.data["results"]], ["Post 2", "Post 1"]
+        )
+
+    def test_mine_can_be_streamed(self):
+        response = self.client.get("/posts/mine/?stream=true")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(
+            [post["body"] for post in data],
+            ["Post 4", "Post 3", "Post 2", "Post 1", "Post 0"],
+        )
+        self.assertEqual(data[0]["circle"]["role"], "OWNER")
+
+    def test_streaming_nothing_returns_an_empty_list(self):
+        Post.objects.all().delete()
+
+        response = self.client.get("/posts/mine/?stream=true")
+
+        self.assertEqual(json.loads(b"".join(response.streaming_content)), [])
+
+
+class ListCirclesTest(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        for n in range(3):
+            CircleFactory(name=f"Circle {n}", owners=[self.user])
+        self.client.login(email=self.user.email, password="testpassword")
+
+    def test_circles_are_a_list_by_default(self):
+        response = self.client.get("/circles/")
+
+        self.assertEqual(len(response.data), 3)
+
+    def test_circles_can_be_paginated(self):
+        response = self.client.get("/circles/?page_size=2")
+
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual(len(response.data["results"]), 2)
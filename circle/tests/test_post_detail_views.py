@@ -0,0 +1,87 @@
+from circle.models import Post
+from rest_framework.test import APITestCase
+
+from .factories import CircleFactory, UserFactory
+from .util import TempMediaMixin
+
+
+class PostDetailTest(TempMediaMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = UserFactory(name="Author")
+        self.member = UserFactory()
+        self.circle = CircleFactory(
+            owners=[self.author], members=[self.member, UserFactory()]
+        )
+        self.post = Post.objects.create(
+            author=self.author, circle=self.circle, body="Hello"
+        )
+        self.url = f"/posts/{self.post.pk}/"
+
+    def login(self, user):
+        self.client.login(email=user.email, password="testpassword")
+
+    def upload_image(self):
+        return self.client.put(
+            f"{self.url}image/",
+            b"image",
+            content_type="image/jpeg",
+            HTTP_CONTENT_DISPOSITION="attachment; filename=photo.jpg",
+        )
+
+    def test_members_can_read_a_post(self):
+        self.login(self.member)
+
+        # session, user, post, circle members, role
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["author"], "Author")
+        self.assertEqual(len(response.data["circle"]["members"]), 3)
+
+    def test_other_users_cannot_see_a_post(self):
+        self.login(UserFactory())
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_author_can_edit_a_post(self):
+        self.login(self.author)
+
+        # session, user, post, update
+        with self.assertNumQueries(4):
+            response = self.client.patch(self.url, {"body": "*Hi*"}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.body_html, "<p><em>Hi</em></p>")
+
+    def test_other_members_cannot_edit_or_delete_a_post(self):
+        self.login(self.member)
+
+        self.assertEqual(
+            self.client.patch(self.url, {"body": "Mine"}, format="json").status_code,
+            403,
+        )
+        self.assertEqual(self.client.delete(self.url).status_code, 403)
+        self.assertTrue(Post.objects.filter(pk=self.post.pk).exists())
+
+    def test_author_can_add_an_image(self):
+        self.login(self.author)
+
+        response = self.upload_image()
+
+        self.assertEqual(response.status_code, 201)
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.image.name.startswith("post_images/photo"))
+
+    def test_images_from_others_are_not_stored(self):
+        self.login(self.member)
+
+        response = self.upload_image()
+
+        self.assertEqual(response.status_code, 403)
+        self.post.refresh_from_db()
+        self.assertFalse(self.post.image)
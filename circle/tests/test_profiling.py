@@ -0,0 +1,74 @@
+import os
+import pstats
+
+from circle.models import Post
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from .factories import CircleFactory, UserFactory
+from .util import temp_dir, use_settings
+
+
+class ProfilingTest(APITestCase):
+    def setUp(self):
+        self.profile_dir = temp_dir(self)
+        use_settings(self, PROFILE_DIR=self.profile_dir, PROFILE_SAMPLE_INTERVAL=0.001)
+
+        self.staff = UserFactory(is_staff=True)
+        self.circle = CircleFactory(owners=[self.staff])
+        Post.objects.create(author=self.staff, circle=self.circle, body="Hi")
+        token = Token.objects.create(user=self.staff)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def test_staff_requests_are_profiled_with_cprofile(self):
+        response = self.client.get(
+            f"/posts/?circle={self.circle.pk}", HTTP_X_PROFILE="cprofile"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        profile_id = response["X-Profile-Id"]
+        profile = self.client.get(f"/profiles/{profile_id}/").data
+        self.assertEqual(profile["mode"], "cprofile")
+        self.assertEqual(profile["path"], f"/posts/?circle={self.circle.pk}")
+        self.assertGreater(profile["query_count"], 0)
+        self.assertEqual(len(profile["queries"]), profile["query_count"])
+        self.assertTrue(profile["functions"])
+
+        download = self.client.get(f"/profiles/{profile_id}/download/")
+        self.assertEqual(download.status_code, 200)
+        pstats.Stats(os.path.join(self.profile_dir, f"{profile_id}.prof"))
+
+    def test_staff_requests_can_be_sampled(self):
+        response = self.client.get("/posts/?profile=sample")
+
+        profile_id = response["X-Profile-Id"]
+        profile = self.client.get(f"/profiles/{profile_id}/").data
+        self.assertEqual(profile["mode"], "sample")
+        self.assertTrue(
+            os.path.exists(os.path.join(self.profile_dir, f"{profile_id}.collapsed"))
+        )
+
+        listed = self.client.get("/profiles/").data
+        self.assertEqual([p["id"] for p in listed], [profile_id])
+
+    def test_requests_without_the_flag_are_not_profiled(self):
+        response = self.client.get("/posts/")
+
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+    def test_other_users_are_not_profiled(self):
+        user = UserFactory()
+        self.client.credentials()
+        self.client.login(email=user.email, password="testpassword")
+
+        response = self.client.get("/posts/", HTTP_X_PROFILE="cprofile")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(self.client.get("/profiles/").status_code, 403)
+
+    def test_unknown_profiles_are_not_found(self):
+        response = self.client.get("/profiles/..%2Fsecret/")
+
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,91 @@
+import os
+
+from circle import jobs
+from circle.models import (
+    Circle,
+    CircleInvitation,
+    CircleMembership,
+    Job,
+    JobStatus,
+    Post,
+    User,
+)
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from .factories import CircleFactory, CircleInvitationFactory, UserFactory
+from .util import TempMediaMixin
+
+
+@override_settings(PURGE_BATCH_SIZE=2)
+class DeleteCircleTest(TempMediaMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = UserFactory()
+        self.members = [UserFactory() for _ in range(3)]
+        self.circle = CircleFactory(owners=[self.owner], members=self.members)
+        CircleInvitationFactory(circle=self.circle)
+        for n in range(5):
+            Post.objects.create(author=self.owner, circle=self.circle, body=f"{n}")
+        self.post = Post.objects.first()
+        self.post.image.save("photo.jpg", ContentFile(b"image"), save=True)
+
+    def test_deleted_circle_is_hidden_then_purged(self):
+        self.client.login(email=self.owner.email, password="testpassword")
+
+        response = self.client.delete(f"/circles/{self.circle.pk}/")
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(f"/circles/{self.circle.pk}/").status_code, 404)
+        self.assertEqual(self.client.get("/posts/").data["count"], 0)
+        self.assertEqual(Post.objects.filter(circle=self.circle).count(), 5)
+
+        image_path = self.post.image.path
+        jobs.run_pending()
+
+        self.assertFalse(Circle.objects.filter(pk=self.circle.pk).exists())
+        self.assertFalse(Post.objects.filter(circle=self.circle).exists())
+        self.assertFalse(CircleMembership.objects.filter(circle=self.circle).exists())
+        self.assertFalse(CircleInvitation.objects.filter(circle=self.circle).exists())
+        self.assertFalse(os.path.exists(image_path))
+        job = Job.objects.get(task="circle.tasks.purge_circle")
+        self.assertEqual(job.status, JobStatus.DONE)
+        self.assertEqual(
+            job.progress["deleted"], {"posts": 5, "invitations": 1, "memberships": 4}
+        )
+
+    def test_member_cannot_delete_circle(self):
+        self.client.login(email=self.members[0].email, password="testpassword")
+
+        response = self.client.delete(f"/circles/{self.circle.pk}/")
+
+        self.assertEqual(response.status_code, 403)
+        self.assertIsNone(Circle.objects.get(pk=self.circle.pk).deleted_at)
+
+
+class DeleteUserTest(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.friend = UserFactory()
+        self.circle = CircleFactory(owners=[self.friend], members=[self.user])
+        Post.objects.create(author=self.user, circle=self.circle, body="Hi")
+
+    def test_deleted_user_is_deactivated_then_purged(self):
+        self.client.login(email=self.user.email, password="testpassword")
+
+        response = self.client.delete(
+            "/auth/users/me/", {"current_password": "testpassword"}
+        )
+
+        self.assertEqual(response.status_code, 204)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.client.login(email=self.friend.email, password="testpassword")
+        self.assertEqual(self.client.get("/posts/").data["count"], 0)
+
+        jobs.run_pending()
+
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(self.circle.memberships.count(), 1)
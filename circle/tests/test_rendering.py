@@ -0,0 +1,89 @@
+import importlib
+from io import StringIO
+
+from circle.models import Post
+from circle.rendering import RENDERER_VERSION, render_markdown
+from django.apps import apps
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from .factories import CircleFactory, UserFactory
+
+
+class RenderMarkdownTest(SimpleTestCase):
+    def test_markdown_is_rendered(self):
+        self.assertEqual(render_markdown("**Hi** there"), "<p><strong>Hi</strong> there</p>")
+
+    def test_raw_html_is_escaped(self):
+        html = render_markdown("<script>alert(1)</script>\n\n<b>bold</b>")
+
+        self.assertNotIn("<script>", html)
+        self.assertNotIn("<b>", html)
+        self.assertIn("&lt;script&gt;", html)
+
+    def test_unsafe_links_are_removed(self):
+        self.assertEqual(
+            render_markdown("[click](javascript:alert(1))"), "<p><a>click</a></p>"
+        )
+        self.assertIn(
+            'href="https://example.org"', render_markdown("[ok](https://example.org)")
+        )
+
+    def test_encoded_unsafe_links_are_removed(self):
+        for url in [
+            "&#106;avascript:alert(1)",
+            "&#x6A;avascript:alert(1)",
+            "jav&#x09;ascript:alert(1)",
+            "java&Tab;script:alert(1)",
+            "&#0000106avascript:alert(1)",
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(render_markdown(f"[x]({url})"), "<p><a>x</a></p>")
+                self.assertNotIn("src", render_markdown(f"![x]({url})"))
+
+
+class PostBodyHTMLTest(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.circle = CircleFactory(owners=[self.user])
+
+    def test_body_is_rendered_when_post_is_saved(self):
+        post = Post.objects.create(author=self.user, circle=self.circle, body="*Hi*")
+        self.assertEqual(post.body_html, "<p><em>Hi</em></p>")
+
+        post.body = "**Bye**"
+        post.save(update_fields=["body"])
+
+        post.refresh_from_db()
+        self.assertEqual(post.body_html, "<p><strong>Bye</strong></p>")
+        self.assertEqual(post.body_html_version, RENDERER_VERSION)
+
+    def test_stale_posts_are_rerendered(self):
+        post = Post.objects.create(author=self.user, circle=self.circle, body="*Hi*")
+        Post.objects.filter(pk=post.pk).update(body_html="", body_html_version=0)
+
+        call_command("rerender_posts", stdout=StringIO())
+
+        post.refresh_from_db()
+        self.assertEqual(post.body_html, "<p><em>Hi</em></p>")
+        self.assertEqual(post.body_html_version, RENDERER_VERSION)
+
+    def test_posts_from_before_body_html_are_backfilled(self):
+        migration = importlib.import_module("circle.migrations.0018_render_post_bodies")
+        post = Post.objects.create(author=self.user, circle=self.circle, body="*Hi*")
+        Post.objects.filter(pk=post.pk).update(body_html="", body_html_version=0)
+
+        migration.render_bodies(apps, None)
+
+        post.refresh_from_db()
+        self.assertEqual(post.body_html, "<p><em>Hi</em></p>")
+        self.assertEqual(post.body_html_version, RENDERER_VERSION)
+
+    def test_stale_posts_are_rendered_when_read(self):
+        post = Post.objects.create(author=self.user, circle=self.circle, body="*Hi*")
+        Post.objects.filter(pk=post.pk).update(body_html="", body_html_version=0)
+        self.client.login(email=self.user.email, password="testpassword")
+
+        response = self.client.get(f"/posts/{post.pk}/")
+
+        self.assertEqual(response.json()["body_html"], "<p><em>Hi</em></p>")
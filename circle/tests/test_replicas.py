@@ -0,0 +1,158 @@
+from unittest import mock
+
+from circle import replicas
+from circle.models import CircleMembership, Post, User
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .factories import CircleFactory, UserFactory
+from .util import url
+
+
+@override_settings(
+    DATABASE_REPLICAS=["replica_0", "replica_1"],
+    REPLICA_MAX_LAG=5,
+    REPLICA_STICKY_SECONDS=10,
+)
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = replicas.ReplicaRouter()
+        self.lag = mock.patch(
+            "circle.replicas.replica_lag",
+            side_effect=lambda alias: {"replica_0": 0.5, "replica_1": 60}[alias],
+        ).start()
+        # The tests probe the replicas themselves rather than in a thread.
+        mock.patch("circle.replicas.start_health_checks").start()
+        self.addCleanup(mock.patch.stopall)
+        replicas.refresh_health()
+        self.addCleanup(replicas._health.update, healthy=[])
+
+    def test_reads_go_to_a_healthy_replica(self):
+        self.assertEqual(self.router.db_for_read(Post), "replica_0")
+
+    def test_reads_do_not_wait_for_health_checks(self):
+        self.lag.reset_mock()
+
+        self.router.db_for_read(Post)
+
+        self.lag.assert_not_called()
+        replicas.start_health_checks.assert_called_once_with()
+
+    def test_database_cache_is_read_from_the_primary(self):
+        entry = DatabaseCache("django_cache", {}).cache_model_class
+
+        self.assertIsNone(self.router.db_for_read(entry))
+
+    def test_writes_go_to_the_primary(self):
+        self.assertEqual(self.router.db_for_write(Post), "default")
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate("replica_0", "circle"))
+        self.assertIsNone(self.router.allow_migrate("default", "circle"))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        self.assertIsNone(self.router.db_for_read(Post))
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        factory = RequestFactory()
+        middleware = replicas.ReplicaStickinessMiddleware(
+            lambda request: HttpResponse(self.router.db_for_read(Post) or "default")
+        )
+
+        response = middleware(factory.post("/posts/"))
+        cookie = response.cookies[replicas.STICKY_COOKIE]
+        self.assertEqual(cookie["max-age"], 10)
+
+        request = factory.get("/posts/")
+        request.COOKIES[replicas.STICKY_COOKIE] = cookie.value
+        self.assertEqual(middleware(request).content, b"default")
+        self.assertEqual(middleware(factory.get("/posts/")).content, b"replica_0")
+
+    def test_streamed_responses_keep_reading_from_the_primary(self):
+        def stream():
+            yield self.router.db_for_read(Post) or "default"
+
+        middleware = replicas.ReplicaStickinessMiddleware(
+            lambda request: StreamingHttpResponse(stream())
+        )
+        request = RequestFactory().get("/posts/")
+        request.COOKIES[replicas.STICKY_COOKIE] = "1"
+
+        response = middleware(request)
+
+        self.assertEqual(b"".join(response.streaming_content), b"default")
+
+
+def replicate(*objs):
+    """Copy rows to the replica, as replication would."""
+    for obj in objs:
+        type(obj).objects.using("replica_0").bulk_create([obj])
+
+
+@override_settings(DATABASE_REPLICAS=["replica_0"], REPLICA_STICKY_SECONDS=10)
+class TwoDatabaseTest(TransactionTestCase):
+    """
+    The primary and a replica that lags behind it, as two real databases. Reads
+    inside a transaction go to the primary, so this can't run in one.
+    """
+
+    databases = {"default", "replica_0"}
+
+    def setUp(self):
+        mock.patch("circle.replicas.start_health_checks").start()
+        self.addCleanup(mock.patch.stopall)
+        replicas.refresh_health()
+        self.addCleanup(replicas._health.update, healthy=[])
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        self.user = UserFactory()
+        self.friend = UserFactory()
+        self.circle = CircleFactory(owners=[self.user], members=[self.friend])
+        self.tokens = [Token.objects.create(user=u) for u in (self.user, self.friend)]
+        replicate(
+            *User.objects.using("default"),
+            *Token.objects.using("default"),
+            self.circle,
+            *CircleMembership.objects.using("default"),
+        )
+
+    def client_for(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        return client
+
+    def feed(self, client):
+        return [post["body"] for post in client.get("/posts/").data["results"]]
+
+    def test_a_user_reads_their_own_writes_from_any_client(self):
+        writer = self.client_for(self.tokens[0])
+        response = writer.post(
+            "/posts/",
+            {"circle": url("circle-detail", pk=self.circle.pk), "body": "New"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Post.objects.using("default").exists())
+        self.assertFalse(Post.objects.using("replica_0").exists())
+
+        # Another client of theirs, with no cookie from the write.
+        self.assertEqual(self.feed(self.client_for(self.tokens[0])), ["New"])
+        # Everyone else reads the replica, which hasn't caught up.
+        self.assertEqual(self.feed(self.client_for(self.tokens[1])), [])
+
+        cache.delete(replicas.sticky_key(self.user.pk))
+        self.assertEqual(self.feed(self.client_for(self.tokens[0])), [])
+
+        replicate(*Post.objects.using("default"))
+        self.assertEqual(self.feed(self.client_for(self.tokens[1])), ["New"])
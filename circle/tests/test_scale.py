@@ -0,0 +1,38 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from .fixtures import large_circle
+
+MEMBERS = 1000
+
+
+class LargeCircleTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = large_circle(members=MEMBERS, posts=20)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client.login(email=self.data.owner.email, password="testpassword")
+
+    def test_circle_list_lists_every_member(self):
+        # session, user, circles with your role, members
+        with self.assertNumQueries(4):
+            response = self.client.get("/circles/")
+
+        self.assertEqual(len(response.data[0]["members"]), MEMBERS + 1)
+
+    def test_directory_pages_through_every_member(self):
+        with self.assertNumQueries(3):  # session, user, directory
+            response = self.client.get("/directory/", {"page_size": 500})
+
+        self.assertEqual(response.data["count"], MEMBERS)
+        self.assertEqual(len(response.data["results"]), 500)
+
+    def test_feed_queries_do_not_grow_with_members(self):
+        # session, user, count, posts, members, role
+        with self.assertNumQueries(6):
+            response = self.client.get("/posts/")
+
+        self.assertEqual(response.data["count"], 20)
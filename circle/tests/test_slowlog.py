@@ -0,0 +1,126 @@
+import json
+import os
+from unittest import mock
+
+from circle import slowlog
+from circle.models import Post
+from circle.slowlog import normalize_sql, top_slow_queries
+from django.db import connection, transaction
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from .factories import CircleFactory, UserFactory
+from .util import temp_dir, use_settings
+
+
+class NormalizeSqlTest(APITestCase):
+    def test_values_are_replaced_with_placeholders(self):
+        sql = "SELECT * FROM post WHERE id IN (%s, %s, %s) AND body = 'x' LIMIT 21"
+
+        self.assertEqual(
+            normalize_sql(sql),
+            "SELECT * FROM post WHERE id IN (...) AND body = ? LIMIT ?",
+        )
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+class SlowQueryLogTest(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.circle = CircleFactory(owners=[self.user])
+        Post.objects.create(author=self.user, circle=self.circle, body="Hello")
+        self.client.login(email=self.user.email, password="testpassword")
+
+    def test_slow_queries_are_logged_with_call_site_and_plan(self):
+        with mock.patch.object(slowlog.logger, "warning") as warning:
+            self.client.get("/posts/")
+
+        entries = [json.loads(call.args[0]) for call in warning.call_args_list]
+        role_query = next(
+            entry
+            for entry in entries
+            if entry["serializer"] == "CircleSerializer.get_membership"
+        )
+        self.assertEqual(role_query["view"], "PostViewSet.list")
+        self.assertTrue(role_query["location"].startswith("circle/serializers.py:"))
+        self.assertIn("circle_circlemembership", role_query["sql"])
+        self.assertTrue(role_query["plan"])
+
+    def test_failed_explain_rolls_back_to_a_savepoint(self):
+        rollback = mock.patch.object(
+            connection.ops,
+            "savepoint_rollback_sql",
+            wraps=connection.ops.savepoint_rollback_sql,
+        )
+
+        with transaction.atomic(), rollback as savepoint_rollback_sql:
+            plan = slowlog.explain(connection, "SELECT missing FROM nowhere", ())
+            self.assertTrue(Post.objects.exists())
+
+        self.assertIsNone(plan)
+        savepoint_rollback_sql.assert_called_once_with("slowlog_explain")
+
+    def test_queries_under_the_threshold_are_not_logged(self):
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=60000):
+            with mock.patch.object(slowlog.logger, "warning") as warning:
+                self.client.get("/circles/")
+
+        warning.assert_not_called()
+
+
+class SlowQueryViewTest(APITestCase):
+    def setUp(self):
+        self.log_file = os.path.join(temp_dir(self), "slow_queries.log")
+        entries = [
+            ("SELECT a", 300),
+            ("SELECT a", 300),
+            ("SELECT b", 500),
+            ("SELECT c", 250),
+        ]
+        with open(self.log_file + ".1", "w") as file:
+            file.write(json.dumps(self.entry(*entries[0])) + "\n")
+        with open(self.log_file, "w") as file:
+            for entry in entries[1:]:
+                file.write(json.dumps(self.entry(*entry)) + "\n")
+
+        use_settings(self, SLOW_QUERY_LOG_FILE=self.log_file)
+
+    def entry(self, sql, duration):
+        return {
+            "time": "2026-10-19T12:00:00+00:00",
+            "database": "default",
+            "duration_ms": duration,
+            "sql": sql,
+            "view": "PostViewSet.list",
+            "serializer": None,
+            "location": "circle/views.py:1 in get_queryset",
+            "plan": "SCAN post",
+            "analyzed": False,
+        }
+
+    def test_queries_are_aggregated(self):
+        queries = top_slow_queries()
+
+        self.assertEqual(
+            [query["sql"] for query in queries], ["SELECT a", "SELECT b", "SELECT c"]
+        )
+        self.assertEqual(queries[0]["count"], 2)
+        self.assertEqual(queries[0]["mean_ms"], 300)
+
+    def test_staff_can_see_top_queries(self):
+        staff = UserFactory(is_staff=True)
+        self.client.login(email=staff.email, password="testpassword")
+
+        response = self.client.get("/slow-queries/?order=max&limit=1")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["sql"], "SELECT b")
+
+    def test_other_users_cannot(self):
+        user = UserFactory()
+        self.client.login(email=user.email, password="testpassword")
+
+        response = self.client.get("/slow-queries/")
+
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,88 @@
+import os
+from unittest import mock
+
+from circle.throttling import BucketStore
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from .factories import CircleFactory, UserFactory
+from .util import temp_dir, use_settings
+
+
+class BucketStoreTest(TestCase):
+    def setUp(self):
+        self.store = BucketStore(os.path.join(temp_dir(self), "throttle.db"))
+
+    def test_bucket_allows_a_burst_then_refills_at_the_rate(self):
+        with mock.patch("time.time", return_value=1000.0):
+            self.assertEqual(self.store.take("key", rate=1, burst=2), 0)
+            self.assertEqual(self.store.take("key", rate=1, burst=2), 0)
+            self.assertAlmostEqual(self.store.take("key", rate=1, burst=2), 1.0)
+
+        with mock.patch("time.time", return_value=1000.5):
+            self.assertAlmostEqual(self.store.take("key", rate=1, burst=2), 0.5)
+
+        with mock.patch("time.time", return_value=1001.0):
+            self.assertEqual(self.store.take("key", rate=1, burst=2), 0)
+
+    def test_buckets_are_shared_through_the_file(self):
+        other = BucketStore(self.store.path)
+
+        self.assertEqual(self.store.take("key", rate=1, burst=1), 0)
+        self.assertGreater(other.take("key", rate=1, burst=1), 0)
+
+    def test_clock_is_read_while_holding_the_write_lock(self):
+        connection = self.store.connection()
+        in_transaction = []
+
+        def now():
+            in_transaction.append(connection.in_transaction)
+            return 1000.0
+
+        with mock.patch("time.time", side_effect=now):
+            self.store.take("key", rate=1, burst=1)
+
+        self.assertEqual(in_transaction, [True])
+        self.assertEqual(connection.execute("PRAGMA synchronous").fetchone(), (1,))
+
+
+class ThrottleTest(APITestCase):
+    def setUp(self):
+        use_settings(
+            self,
+            THROTTLE_DB=os.path.join(temp_dir(self), "throttle.db"),
+            THROTTLE_RATES={
+                "default": {"rate": "100/min", "burst": 100},
+                "feed": {"rate": "1/min", "burst": 2},
+            },
+        )
+
+        self.user = UserFactory()
+        self.circle = CircleFactory(owners=[self.user])
+        self.client.login(email=self.user.email, password="testpassword")
+
+    def test_feed_is_throttled_with_retry_after(self):
+        self.assertEqual(self.client.get("/posts/").status_code, 200)
+        self.assertEqual(self.client.get("/posts/mine/").status_code, 200)
+
+        response = self.client.get("/posts/")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(55 <= int(response["Retry-After"]) <= 60)
+
+    def test_scopes_are_separate(self):
+        for _ in range(3):
+            self.client.get("/posts/")
+
+        self.assertEqual(self.client.get("/circles/").status_code, 200)
+
+    def test_users_have_separate_buckets(self):
+        for _ in range(3):
+            self.client.get("/posts/")
+        other = UserFactory()
+        token = Token.objects.create(user=other)
+        self.client.logout()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        self.assertEqual(self.client.get("/posts/").status_code, 200)
@@ -0,0 +1,130 @@
+import datetime
+import io
+
+from circle import archive, unread
+from circle.models import CircleMembership, Post
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from .factories import CircleFactory, UserFactory
+from .util import temp_dir, url, use_settings
+
+
+class UnreadCountTest(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.friend = UserFactory()
+        self.circle = CircleFactory(owners=[self.user], members=[self.friend])
+        self.quiet = CircleFactory(name="Quiet", owners=[self.user])
+        self.client.login(email=self.friend.email, password="testpassword")
+
+    def unread_count(self, user):
+        return CircleMembership.objects.get(circle=self.circle, user=user).unread_count
+
+    def create_post(self, body="Hello"):
+        return self.client.post(
+            "/posts/",
+            {"circle": url("circle-detail", pk=self.circle.pk), "body": body},
+            format="json",
+        )
+
+    def test_new_posts_are_unread_for_everyone_but_the_author(self):
+        self.create_post()
+        self.create_post()
+
+        self.assertEqual(self.unread_count(self.user), 2)
+        self.assertEqual(self.unread_count(self.friend), 0)
+
+    def test_batches_count_every_post(self):
+        circle_url = url("circle-detail", pk=self.circle.pk)
+
+        self.client.post(
+            "/posts/batch/",
+            {"posts": [{"circle": circle_url, "body": str(n)} for n in range(3)]},
+            format="json",
+        )
+
+        self.assertEqual(self.unread_count(self.user), 3)
+
+    def test_circles_show_unread_counts(self):
+        self.create_post()
+        self.client.login(email=self.user.email, password="testpassword")
+
+        response = self.client.get("/circles/")
+
+        counts = {circle["name"]: circle["unread_count"] for circle in response.data}
+        self.assertEqual(counts, {"Test Circle": 1, "Quiet": 0})
+
+    def test_summary_is_one_query(self):
+        self.create_post()
+        self.client.login(email=self.user.email, password="testpassword")
+
+        with self.assertNumQueries(3):  # session, user, summary
+            response = self.client.get("/circles/unread/")
+
+        self.assertEqual(response.data["total"], 1)
+        self.assertEqual(
+            [(c["pk"], c["unread_count"]) for c in response.data["circles"]],
+            [(self.circle.pk, 1), (self.quiet.pk, 0)],
+        )
+
+    def test_marking_a_circle_read(self):
+        self.create_post()
+        self.client.login(email=self.user.email, password="testpassword")
+
+        response = self.client.post(f"/circles/{self.circle.pk}/read/")
+
+        self.assertEqual(response.status_code, 204)
+        membership = CircleMembership.objects.get(circle=self.circle, user=self.user)
+        self.assertEqual(membership.unread_count, 0)
+        self.assertIsNotNone(membership.last_read_at)
+
+    def test_members_can_mark_read_but_not_outsiders(self):
+        response = self.client.post(f"/circles/{self.quiet.pk}/read/")
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_deleting_an_unread_post_uncounts_it(self):
+        first = self.create_post().data["url"]
+        self.client.login(email=self.user.email, password="testpassword")
+        self.client.post(f"/circles/{self.circle.pk}/read/")
+        self.client.login(email=self.friend.email, password="testpassword")
+        second = self.create_post().data["url"]
+
+        self.client.delete(second)
+        self.client.delete(first)
+
+        self.assertEqual(self.unread_count(self.user), 0)
+
+    def test_posts_committed_after_marking_read_are_not_counted(self):
+        post = Post(author=self.friend, circle=self.circle, body="Slow")
+        post.save()
+        # The reader marks the circle read before the post's transaction commits
+        # and its counts are updated.
+        unread.mark_read(self.circle, self.user)
+
+        unread.posts_created([post])
+
+        self.assertEqual(self.unread_count(self.user), 0)
+
+    def test_archiving_uncounts_archived_posts(self):
+        use_settings(self, PRIVATE_MEDIA_ROOT=temp_dir(self))
+        self.create_post()
+        Post.objects.update(posted_at=timezone.now() - datetime.timedelta(days=400))
+
+        archive.archive_posts(timezone.now() - datetime.timedelta(days=365))
+
+        self.assertEqual(self.unread_count(self.user), 0)
+
+    def test_recount_matches_the_posts(self):
+        self.create_post()
+        self.create_post()
+        Post.objects.filter(body="Hello").first().delete()
+        CircleMembership.objects.update(unread_count=7)
+
+        call_command("recount_unread", stdout=io.StringIO())
+
+        self.assertEqual(self.unread_count(self.user), 1)
+        self.assertEqual(self.unread_count(self.friend), 0)
+        self.assertEqual(unread.summary(self.user)[1]["unread_count"], 0)
@@ -1,4 +1,34 @@
+import tempfile
+
+from django.test import override_settings
 from rest_framework.reverse import reverse
 
+
 def url(name, **kwargs):
     return "http://testserver" + reverse(name, kwargs=kwargs)
+
+
+def temp_dir(test):
+    """A new temporary directory, removed once `test` has finished."""
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    return directory.name
+
+
+def use_settings(test, **settings):
+    """Override settings from within a test, until it has finished."""
+    override = override_settings(**settings)
+    override.enable()
+    test.addCleanup(override.disable)
+
+
+class TempMediaMixin:
+    """Gives each test its own empty MEDIA_ROOT and PRIVATE_MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = temp_dir(self)
+        self.private_media_root = temp_dir(self)
+        use_settings(
+            self, MEDIA_ROOT=self.media_root, PRIVATE_MEDIA_ROOT=self.private_media_root
+        )
@@ -0,0 +1,139 @@
+"""
+Token bucket rate limiting.
+
+Each user (or token, or IP address for anonymous requests) gets a bucket per
+scope that holds up to `burst` tokens and refills at `rate`. Every request takes
+a token, and a request that finds the bucket empty is refused with a 429 and a
+`Retry-After` of how long until the next token.
+
+Buckets are kept in a SQLite file, `THROTTLE_DB`, so that every gunicorn worker
+on a machine shares them. Each update runs in a `BEGIN IMMEDIATE` transaction,
+which takes SQLite's write lock before reading the clock and the bucket, so two
+workers can never both spend the same token. The file is in WAL mode with
+`synchronous=NORMAL`: a crash can lose the last few updates, which only refills
+some buckets early, but commits don't wait for an fsync.
+
+A view picks its scope per action with `throttle_scopes`, e.g.
+`{"list": "feed"}`, or for all its actions with `throttle_scope`. Anything else
+uses the "default" scope. The rates are set in `THROTTLE_RATES`.
+"""
+import hashlib
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.authtoken.models import Token
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+DURATIONS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+# Buckets idle for this long are full again, so their rows can be dropped.
+IDLE_SECONDS = 86400
+
+
+def parse_rate(rate):
+    """Turn "120/min" into tokens per second."""
+    count, period = rate.split("/")
+    return int(count) / DURATIONS[period[0]]
+
+
+class BucketStore:
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    def connection(self):
+        # One connection per thread, and none inherited from a parent process.
+        if getattr(self.local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS bucket "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    def take(self, key, rate, burst):
+        """
+        Take a token from the bucket. Returns 0 if there was one, or else the
+        seconds until there will be.
+        """
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # Only read the clock once no other worker can write, so that
+            # `updated` never goes backwards.
+            now = time.time()
+            row = connection.execute(
+                "SELECT tokens, updated FROM bucket WHERE key = ?", [key]
+            ).fetchone()
+            tokens = burst if row is None else row[0] + (now - row[1]) * rate
+            tokens = min(tokens, burst)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            connection.execute(
+                "INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)",
+                [key, tokens, now],
+            )
+            if random.random() < 0.001:
+                connection.execute(
+                    "DELETE FROM bucket WHERE updated < ?", [now - IDLE_SECONDS]
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return wait
+
+
+_stores = {}
+
+
+def get_store():
+    path = settings.THROTTLE_DB
+    if path not in _stores:
+        _stores[path] = BucketStore(path)
+    return _stores[path]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    def get_scope(self, view):
+        scopes = getattr(view, "throttle_scopes", {})
+        action = getattr(view, "action", None)
+        return scopes.get(action) or getattr(view, "throttle_scope", "default")
+
+    def get_key(self, request, scope):
+        if isinstance(request.auth, Token):
+            # Never store the token itself.
+            digest = hashlib.sha256(request.auth.key.encode()).hexdigest()[:32]
+            return f"{scope}:token:{digest}"
+        if request.user and request.user.is_authenticated:
+            return f"{scope}:user:{request.user.pk}"
+        return f"{scope}:ip:{self.get_ident(request)}"
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(view)
+        config = settings.THROTTLE_RATES.get(scope)
+        if config is None:
+            return True
+        rate = parse_rate(config["rate"])
+        key = self.get_key(request, scope)
+        try:
+            self.retry_after = get_store().take(key, rate, config["burst"])
+        except sqlite3.Error:
+            # Better to serve the request than fail it for want of a counter.
+            logger.exception("Could not update throttle bucket %s", key)
+            return True
+        return not self.retry_after
+
+    def wait(self):
+        return self.retry_after
@@ -0,0 +1,99 @@
+"""
+Unread counts for the home screen.
+
+Each membership keeps `unread_count`, the number of posts by others in the circle
+since the member last marked it read (`last_read_at`) or, if they never have,
+since they joined. New posts add to the counts of the circle's other members
+with one UPDATE per circle, and marking a circle read sets the count back to 0,
+so reading the counts never touches the posts table.
+
+A post only counts for members who last read the circle before it was posted,
+checked in the UPDATE itself. So a post whose transaction commits after a
+member marked the circle read is not counted for them, just as a recount
+wouldn't.
+
+Deleting a post takes it off the counts of the members who hadn't read it.
+Archiving posts and purging a user recount the circles concerned from the posts
+table. `./manage.py recount_unread` does the same for every circle, and is the
+way to repair any counts that have drifted.
+"""
+import functools
+import operator
+from collections import Counter
+
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from circle.models import CircleMembership, Post
+
+
+def _unread_at(posted_at):
+    """Memberships that a post from `posted_at` is unread for."""
+    return Q(last_read_at__lt=posted_at) | Q(
+        last_read_at__isnull=True, joined_at__lt=posted_at
+    )
+
+
+def posts_created(posts):
+    """Count new posts as unread for everyone in their circles but the author."""
+    times = {}
+    for post in posts:
+        key = (post._state.db, post.circle_id, post.author_id)
+        times.setdefault(key, Counter())[post.posted_at] += 1
+    for (db, circle_id, author_id), counts in times.items():
+        added = functools.reduce(
+            operator.add,
+            [
+                Case(When(_unread_at(posted_at), then=Value(count)), default=0)
+                for posted_at, count in counts.items()
+            ],
+        )
+        CircleMembership.objects.using(db).filter(
+            _unread_at(max(counts)), circle_id=circle_id
+        ).exclude(user_id=author_id).update(unread_count=F("unread_count") + added)
+
+
+def post_deleted(post):
+    """Take a deleted post off the counts of the members who hadn't read it."""
+    CircleMembership.objects.using(post._state.db).filter(
+        _unread_at(post.posted_at), circle_id=post.circle_id, unread_count__gt=0
+    ).exclude(user_id=post.author_id).update(unread_count=F("unread_count") - 1)
+
+
+def mark_read(circle, user):
+    circle.memberships.filter(user=user).update(
+        unread_count=0, last_read_at=timezone.now()
+    )
+
+
+def recount(circle_ids=None):
+    """Count each member's unread posts again from the posts table."""
+    memberships = CircleMembership.objects.all()
+    if circle_ids is not None:
+        memberships = memberships.filter(circle_id__in=circle_ids)
+    unread = (
+        Post.objects.filter(
+            circle_id=OuterRef("circle_id"),
+            posted_at__gt=Coalesce(OuterRef("last_read_at"), OuterRef("joined_at")),
+        )
+        .exclude(author_id=OuterRef("user_id"))
+        .order_by()
+        .values("circle_id")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return memberships.update(unread_count=Coalesce(Subquery(unread), Value(0)))
+
+
+def summary(user):
+    """A user's circles with their unread counts, in one query."""
+    memberships = (
+        user.memberships.filter(circle__deleted_at__isnull=True)
+        .order_by("circle_id")
+        .values_list("circle_id", "circle__name", "unread_count", "last_read_at")
+    )
+    return [
+        {"pk": pk, "name": name, "unread_count": count, "last_read_at": read_at}
+        for pk, name, count, read_at in memberships
+    ]
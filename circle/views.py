@@ -1,20 +1,67 @@
+import os
+import posixpath
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Subquery
+from django.db.models.functions import Lower
+from django.http import FileResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.exceptions import ParseError, PermissionDenied, ValidationError
+from rest_framework.exceptions import (
+    NotFound,
+    ParseError,
+    PermissionDenied,
+    ValidationError,
+)
 from rest_framework.generics import get_object_or_404
 from rest_framework.parsers import FileUploadParser, JSONParser
-from rest_framework.permissions import SAFE_METHODS, BasePermission, IsAuthenticated
+from rest_framework.permissions import (
+    SAFE_METHODS,
+    BasePermission,
+    IsAdminUser,
+    IsAuthenticated,
+)
+from rest_framework.reverse import reverse
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import Response
 from rest_framework.viewsets import ModelViewSet, ViewSet
 
-from circle.models import Circle, CircleInvitation, CircleRole, Post, User
+from circle import (
+    archive,
+    directory,
+    events,
+    jobs,
+    profiling,
+    slowlog,
+    unread,
+)
+from circle.pagination import DirectoryPagination, ListResponseMixin
+from circle.models import (
+    Circle,
+    CircleInvitation,
+    CircleMembership,
+    CircleRole,
+    DataExport,
+    JobStatus,
+    Post,
+    User,
+)
 from circle.serializers import (
     CircleInvitationAcceptSerializer,
+    CircleInvitationBulkSerializer,
     CircleInvitationSerializer,
     CircleSerializer,
+    DataExportSerializer,
+    PostBatchItemSerializer,
     PostInSerializer,
     PostOutSerializer,
 )
+from circle.storage import private_storage
 
 """
 - viewset for posts
@@ -56,16 +103,35 @@ class IsPostAuthor(BasePermission):
         if request.method in SAFE_METHODS:
             return True
 
-        return request.user == obj.author
+        return obj.author_id == request.user.pk
 
 
-class CircleViewSet(ModelViewSet):
+class CircleViewSet(ListResponseMixin, ModelViewSet):
+    """
+    GET /circles/ returns every circle you are in. Add `?page=` to get them a page
+    at a time or `?stream=true` to stream them.
+    """
+
     serializer_class = CircleSerializer
     permission_classes = [IsAuthenticated, IsCircleOwner]
-    pagination_class = None
 
     def get_queryset(self):
-        return self.request.user.circles.all()
+        membership = CircleMembership.objects.filter(
+            circle=OuterRef("pk"), user=self.request.user
+        )
+        return (
+            self.request.user.circles.filter(deleted_at__isnull=True)
+            .annotate(
+                user_role=Subquery(membership.values("role")),
+                user_unread_count=Subquery(membership.values("unread_count")),
+            )
+            .order_by("pk")
+        )
+
+    def list(self, request):
+        return self.list_response(
+            self.get_queryset(), CircleSerializer, prefetch=["members"]
+        )
 
     def perform_create(self, serializer):
         """
@@ -75,26 +141,205 @@ class CircleViewSet(ModelViewSet):
         circle = serializer.save()
         circle.memberships.create(user=self.request.user, role=CircleRole.OWNER)
 
+    def perform_destroy(self, instance):
+        """
+        Hide the circle now and delete it and its posts in the background.
+        """
+        instance.soft_delete()
+
+    @action(detail=True, methods=["POST"], permission_classes=[IsAuthenticated])
+    def read(self, request, pk):
+        """Mark every post in the circle as read."""
+        unread.mark_read(self.get_object(), request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-class PostViewSet(ModelViewSet):
+    @action(detail=False, url_path="unread")
+    def unread_summary(self, request):
+        """
+        The unread count of each of your circles, for the home screen:
+        `{"total": ..., "circles": [{"pk", "name", "unread_count", "last_read_at"}]}`.
+        """
+        circles = unread.summary(request.user)
+        total = sum(circle["unread_count"] for circle in circles)
+        return Response({"total": total, "circles": circles})
+
+
+class PostViewSet(ListResponseMixin, ModelViewSet):
     permission_classes = [IsAuthenticated, IsPostAuthor]
     parser_classes = [JSONParser, FileUploadParser]
+    throttle_scopes = {
+        "list": "feed",
+        "mine": "feed",
+        "history": "feed",
+        "create": "post_create",
+        "batch": "post_create",
+    }
 
     @action(detail=False)
     def mine(self, request):
-        posts = Post.objects.filter(author=self.request.user).order_by("-posted_at")
-        serializer = PostOutSerializer(posts, many=True, context={"request": request})
-        return Response(serializer.data)
+        """
+        All of your posts, newest first. Add `?page=` to get them a page at a time
+        or `?stream=true` to stream them.
+        """
+        posts = (
+            Post.objects.filter(
+                author=self.request.user, circle__deleted_at__isnull=True
+            )
+            .select_related("author", "circle")
+            .order_by("-posted_at", "-pk")
+        )
+        return self.list_response(
+            posts, PostOutSerializer, prefetch=["circle__members"]
+        )
+
+    @action(detail=False, methods=["POST"])
+    def batch(self, request):
+        """
+        Create many posts at once, e.g. when an offline client reconnects. Send
+        `{"posts": [{"circle": ..., "body": ..., "idempotency_key": ...}, ...]}`.
+
+        Posts are checked and created together: one query for circle membership,
+        one for already-used idempotency keys, and one insert. The response has a
+        result for each post, in order. A post whose idempotency key has been seen
+        before is not created again; its result points at the existing post.
+        """
+        items = request.data.get("posts") if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not items:
+            raise ParseError("Expected a non-empty list of posts.")
+        if len(items) > settings.MAX_BATCH_POSTS:
+            raise ParseError(
+                f"At most {settings.MAX_BATCH_POSTS} posts can be sent at once."
+            )
+
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            serializer = PostBatchItemSerializer(
+                data=item, context={"request": request}
+            )
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {"status": 400, "errors": serializer.errors}
+
+        member_circles = set(
+            request.user.memberships.filter(
+                circle_id__in={data["circle"] for _, data in valid}
+            ).values_list("circle_id", flat=True)
+        )
+        keys = {data["idempotency_key"] for _, data in valid if "idempotency_key" in data}
+        existing = {}
+        if keys:
+            existing = dict(
+                Post.objects.filter(
+                    author=request.user, idempotency_key__in=keys
+                ).values_list("idempotency_key", "pk")
+            )
+
+        created = []
+        created_by_key = {}
+        for index, data in valid:
+            key = data.get("idempotency_key")
+            if data["circle"] not in member_circles:
+                results[index] = {
+                    "status": 403,
+                    "errors": {"circle": ["You are not a member of this circle."]},
+                }
+            elif key in existing:
+                results[index] = {"status": 200, "pk": existing[key]}
+            elif key in created_by_key:
+                # The same key twice in one batch refers to the same post.
+                results[index] = {"status": 200, "post": created_by_key[key]}
+            else:
+                post = Post(
+                    author=request.user,
+                    circle_id=data["circle"],
+                    body=data["body"],
+                    idempotency_key=key,
+                )
+                post.render_body()
+                created.append(post)
+                if key is not None:
+                    created_by_key[key] = post
+                results[index] = {"status": 201, "post": post}
+
+        try:
+            with transaction.atomic():
+                Post.objects.bulk_create(created)
+                unread.posts_created(created)
+        except IntegrityError:
+            return Response(
+                {"detail": "Some of these posts were created by another request. Retry."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        events.posts_created(created)
+
+        for result in results:
+            if "post" in result:
+                result["pk"] = result.pop("post").pk
+            if "pk" in result:
+                result["url"] = reverse(
+                    "post-detail", kwargs={"pk": result["pk"]}, request=request
+                )
+        return Response({"results": results})
+
+    @action(detail=False)
+    def history(self, request):
+        """
+        A circle's posts from before `?before=` (by default, all of them), newest
+        first, including the archived ones that the feed no longer has. `?circle=` is required and
+        `?limit=` is 20 by default. Follow `next` for older posts; it also has
+        `?before_id=`, so posts from the same moment are not skipped.
+        """
+        if "circle" not in request.query_params:
+            raise ParseError("`circle` is required.")
+        circle = get_object_or_404(
+            Circle,
+            pk=request.query_params["circle"],
+            members=request.user,
+            deleted_at__isnull=True,
+        )
+        before = timezone.now()
+        if "before" in request.query_params:
+            before = parse_datetime(request.query_params["before"])
+            if before is None:
+                raise ParseError("`before` must be a date and time.")
+            if timezone.is_naive(before):
+                before = timezone.make_aware(before)
+        before_id = request.query_params.get("before_id")
+        if before_id is not None:
+            if not before_id.isdigit():
+                raise ParseError("`before_id` must be a post id.")
+            before_id = int(before_id)
+        limit = request.query_params.get("limit", "20")
+        if not limit.isdigit() or not 1 <= int(limit) <= 100:
+            raise ParseError("`limit` must be between 1 and 100.")
+
+        posts, next_page = archive.history(circle.pk, before, int(limit), before_id)
+        for post in posts:
+            if post["image"]:
+                post["image"] = request.build_absolute_uri(
+                    default_storage.url(post["image"])
+                )
+        next_url = None
+        if next_page is not None:
+            next_before, next_id = next_page
+            next_url = replace_query_param(
+                request.build_absolute_uri(), "before", next_before.isoformat()
+            )
+            next_url = replace_query_param(next_url, "before_id", next_id)
+        return Response({"next": next_url, "results": posts})
 
     @action(detail=True, methods=["PUT"])
     def image(self, request, pk, format=None):
+        # Check that this is your post before reading the upload.
+        post = self.get_object()
         if "file" not in request.data:
             raise ParseError("Empty content")
 
         file = request.data["file"]
-        post = self.get_object()
-
-        post.image.save(file.name, file, save=True)
+        post.image.save(file.name, file, save=False)
+        post.save(update_fields=["image"])
         return Response(status=201)
 
     def get_serializer_class(self):
@@ -103,6 +348,8 @@ class PostViewSet(ModelViewSet):
         return PostInSerializer
 
     def get_queryset(self):
+        if self.detail:
+            return self.get_detail_queryset()
         posts = Post.objects.select_related("author", "circle").prefetch_related(
             "circle__members"
         )
@@ -112,29 +359,62 @@ class PostViewSet(ModelViewSet):
 
         # Filter the posts to only ones that are in a circle where the current user
         # is a member. We can use an exact match from the relationship to one user.
-        return posts.filter(circle__members=self.request.user).order_by("-posted_at")
+        return posts.filter(
+            circle__members=self.request.user,
+            circle__deleted_at__isnull=True,
+            author__deleted_at__isnull=True,
+        ).order_by("-posted_at")
+
+    def get_detail_queryset(self):
+        """
+        Posts for the actions on one post. Membership is an indexed existence
+        check rather than the feed's join, and only reads load the author and
+        circle; the circle's members are left for the serializer to load.
+        """
+        is_member = CircleMembership.objects.filter(
+            circle=OuterRef("circle_id"), user=self.request.user
+        )
+        posts = Post.objects.filter(
+            Exists(is_member),
+            circle__deleted_at__isnull=True,
+            author__deleted_at__isnull=True,
+        )
+        if self.request.method in SAFE_METHODS:
+            posts = posts.select_related("author", "circle")
+        return posts
 
     def get_parser_classes(self):
-        print(self.action)
         if self.action == "image":
             return [FileUploadParser]
 
         return [JSONParser]
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        with transaction.atomic():
+            post = serializer.save(author=self.request.user)
+            unread.posts_created([post])
+        events.post_created(post)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            unread.post_deleted(instance)
 
 
-class CircleInvitationViewSet(ViewSet):
+class CircleInvitationViewSet(ListResponseMixin, ViewSet):
     """
     GET /invitations/ -- get all your invites to circles
     GET /invitations/?circle=circle_pk -- get all invites to a circle (if you are an owner or admin)
+        Both lists take `?page=` to get a page at a time or `?stream=true` to stream them.
     GET /invitations/<pk>/ -- view an invitation to a circle
     POST /invitations/ -- create an invitation to a circle (if you are an owner or admin)
+        Send a list of emails as `invitees` instead of `invitee` to invite many people at once.
     PATCH /invitations/<pk>/ -- accept an invitation (if you are the invited person)
     DELETE /invitations/<pk>/ -- delete invitation (if you are the invitee or an owner or admin of the circle)
     """
 
+    throttle_scopes = {"create": "invite"}
+
     def does_not_have_access(self, invitation, user):
         return not (
             user == invitation.invitee or invitation.circle.is_owner_or_admin(user)
@@ -144,23 +424,24 @@ class CircleInvitationViewSet(ViewSet):
         """Show all invitations for a user or for a circle."""
         circle_pk = self.request.query_params.get("circle", None)
         if circle_pk:
-            circle = get_object_or_404(Circle, pk=circle_pk)
+            circle = get_object_or_404(Circle, pk=circle_pk, deleted_at__isnull=True)
             if not circle.is_owner_or_admin(request.user):
                 raise PermissionDenied(
                     detail="You must be an owner or admin of the circle."
                 )
             invitations = circle.invitations.all()
         else:
-            invitations = request.user.invitations.all()
+            invitations = request.user.invitations.filter(
+                circle__deleted_at__isnull=True
+            )
 
-        serializer = CircleInvitationSerializer(
-            instance=invitations,
-            many=True,
-            context={"request": request},
-        )
-        return Response(serializer.data)
+        invitations = invitations.select_related("invitee").order_by("pk")
+        return self.list_response(invitations, CircleInvitationSerializer)
 
     def create(self, request):
+        if "invitees" in request.data:
+            return self.bulk_create(request)
+
         serializer = CircleInvitationSerializer(
             data=request.data, context={"request": request}
         )
@@ -171,11 +452,101 @@ class CircleInvitationViewSet(ViewSet):
             raise PermissionDenied(
                 detail="You must be an owner or admin of the circle to invite someone."
             )
-        if invitee in circle.members.all():
+        if circle.has_member(invitee):
             raise ValidationError(detail="This user is already in this circle.")
-        serializer.save()
+        invitation = serializer.save()
+        events.invitation_created(invitation)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def bulk_create(self, request):
+        """
+        Invite many people by email. All of the invitees are looked up in one
+        query, along with whether they are already members or already invited,
+        and the new invitations are written in one insert. Emails match whatever
+        their case, as addresses are entered by hand.
+        """
+        serializer = CircleInvitationBulkSerializer(
+            data=request.data, context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        circle = serializer.validated_data["circle"]
+        role = serializer.validated_data["role"]
+        emails = list(
+            {
+                email.lower(): email for email in serializer.validated_data["invitees"]
+            }.values()
+        )
+        if not circle.is_owner_or_admin(request.user):
+            raise PermissionDenied(
+                detail="You must be an owner or admin of the circle to invite someone."
+            )
+
+        invitees = (
+            User.objects.annotate(email_lower=Lower("email"))
+            .filter(email_lower__in=[email.lower() for email in emails])
+            .annotate(
+                is_member=Exists(
+                    CircleMembership.objects.filter(circle=circle, user=OuterRef("pk"))
+                ),
+                is_invited=Exists(
+                    CircleInvitation.objects.filter(
+                        circle=circle, invitee=OuterRef("pk")
+                    )
+                ),
+            )
+            .only("pk", "email")
+        )
+        # Exact matches first, in case two accounts differ only in case.
+        invitees = sorted(invitees, key=lambda user: user.email not in emails)
+        by_email = {}
+        for user in invitees:
+            by_email.setdefault(user.email.lower(), user)
+
+        results = []
+        new_invitations = []
+        invited = {}
+        for email in emails:
+            user = by_email.get(email.lower())
+            if user is None:
+                result = "unknown_user"
+            elif user.is_member:
+                result = "already_member"
+            elif user.is_invited:
+                result = "already_invited"
+            else:
+                result = "invited"
+                new_invitations.append(
+                    CircleInvitation(invitee=user, circle=circle, role=role)
+                )
+                invited[user.pk] = len(results)
+            results.append({"invitee": email, "result": result})
+
+        try:
+            with transaction.atomic():
+                created = CircleInvitation.objects.bulk_create(new_invitations)
+        except IntegrityError:
+            # Another request invited some of them since they were looked up.
+            created = []
+            for invitation in new_invitations:
+                invitation, was_created = CircleInvitation.objects.get_or_create(
+                    circle=circle, invitee=invitation.invitee, defaults={"role": role}
+                )
+                if was_created:
+                    created.append(invitation)
+                else:
+                    result = results[invited[invitation.invitee_id]]
+                    result["result"] = "already_invited"
+        events.invitations_created(created)
+
+        return Response(
+            {
+                "circle": serializer.data["circle"],
+                "role": role,
+                "results": results,
+            },
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
     def retrieve(self, request, pk):
         invitation = get_object_or_404(CircleInvitation, pk=pk)
 
@@ -197,7 +568,11 @@ class CircleInvitationViewSet(ViewSet):
             raise PermissionDenied(detail="You must be the invitee.")
         serializer = CircleInvitationAcceptSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        invitation.accept()
+        try:
+            invitation.accept()
+        except CircleInvitation.DoesNotExist:
+            raise NotFound(detail="This invitation has already been accepted.")
+        events.invitation_accepted(invitation)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     def destroy(self, request, pk):
@@ -209,3 +584,138 @@ class CircleInvitationViewSet(ViewSet):
 
         invitation.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class DirectoryViewSet(ViewSet):
+    """
+    GET /directory/ -- everyone who shares a circle with you, once each, with the
+    circles you share, a page at a time
+    """
+
+    def list(self, request):
+        people = directory.get_directory(request.user)
+        paginator = DirectoryPagination()
+        page = paginator.paginate_queryset(people, request, view=self)
+        return paginator.get_paginated_response(page)
+
+
+class DataExportViewSet(ViewSet):
+    """
+    POST /exports/ -- start exporting all of your posts, images and circles
+    GET /exports/ -- list your exports
+    GET /exports/<pk>/ -- check on an export and get its download links
+    GET /exports/<pk>/download/?part=<n> -- download one zip file of an export
+    """
+
+    throttle_scopes = {"create": "export"}
+
+    def get_export(self, pk):
+        return get_object_or_404(DataExport, pk=pk, user=self.request.user)
+
+    def list(self, request):
+        exports = request.user.exports.order_by("-created_at")
+        serializer = DataExportSerializer(
+            exports, many=True, context={"request": request}
+        )
+        return Response(serializer.data)
+
+    def create(self, request):
+        """Start an export, unless one is already in progress."""
+        export = request.user.exports.filter(
+            status__in=[JobStatus.QUEUED, JobStatus.RUNNING]
+        ).first()
+        if export is None:
+            with transaction.atomic():
+                export = DataExport.objects.create(user=request.user)
+                jobs.enqueue("circle.tasks.export_user_data", export.pk)
+        serializer = DataExportSerializer(export, context={"request": request})
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    def retrieve(self, request, pk):
+        serializer = DataExportSerializer(
+            self.get_export(pk), context={"request": request}
+        )
+        return Response(serializer.data)
+
+    @action(detail=True)
+    def download(self, request, pk):
+        export = self.get_export(pk)
+        part = request.query_params.get("part", "1")
+        if not part.isdigit() or not 1 <= int(part) <= len(export.parts):
+            raise NotFound(detail="This export has no such part.")
+        name = export.parts[int(part) - 1]
+        return FileResponse(
+            private_storage.open(name, "rb"),
+            as_attachment=True,
+            filename=posixpath.basename(name),
+        )
+
+
+class SlowQueryViewSet(ViewSet):
+    """
+    GET /slow-queries/ -- the slowest queries in the slow query log, for staff
+
+    `?order=` is one of `total` (the default), `max`, `mean` or `count`, and
+    `?limit=` is how many queries to return (20 by default).
+    """
+
+    permission_classes = [IsAdminUser]
+    orders = {
+        "total": "total_ms",
+        "max": "max_ms",
+        "mean": "mean_ms",
+        "count": "count",
+    }
+
+    def list(self, request):
+        order = request.query_params.get("order", "total")
+        if order not in self.orders:
+            raise ValidationError(
+                {"order": f"Must be one of {', '.join(self.orders)}."}
+            )
+        limit = request.query_params.get("limit", "20")
+        if not limit.isdigit() or int(limit) < 1:
+            raise ValidationError({"limit": "Must be a positive integer."})
+        return Response(
+            slowlog.top_slow_queries(limit=int(limit), order_by=self.orders[order])
+        )
+
+
+class ProfileViewSet(ViewSet):
+    """
+    GET /profiles/ -- requests profiled with `X-Profile`, newest first, for staff
+    GET /profiles/<id>/ -- a profile's slowest functions and query timeline
+    GET /profiles/<id>/download/ -- the pstats file or collapsed stacks
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get_profile(self, pk):
+        profile = profiling.load_profile(pk)
+        if profile is None:
+            raise NotFound(detail="There is no such profile.")
+        return profile
+
+    def list(self, request):
+        return Response(profiling.list_profiles())
+
+    def retrieve(self, request, pk):
+        return Response(self.get_profile(pk))
+
+    @action(detail=True)
+    def download(self, request, pk):
+        profile = self.get_profile(pk)
+        extension = "collapsed" if profile["mode"] == "sample" else "prof"
+        path = profiling.profile_path(pk, extension)
+        return FileResponse(
+            open(path, "rb"), as_attachment=True, filename=os.path.basename(path)
+        )
+
+
+class UserViewSet(DjoserUserViewSet):
+    def perform_destroy(self, instance):
+        """
+        Deactivate the account now and delete it and everything it owns in the
+        background.
+        """
+        instance.soft_delete()
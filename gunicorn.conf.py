@@ -0,0 +1,28 @@
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings_production")
+
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+# The ASGI app, so that /events/ streams are served alongside the API.
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+
+def when_ready(server):
+    from project.warmup import warm_up
+
+    warm_up()
+
+
+def post_worker_init(worker):
+    import asyncio
+
+    from asgiref.sync import sync_to_async
+
+    from circle.replicas import start_health_checks
+    from project.warmup import warm_up_connections
+
+    # Views run in asgiref's thread for synchronous code, so the connections
+    # are opened there, where requests will use them.
+    asyncio.run(sync_to_async(warm_up_connections)())
+    start_health_checks()
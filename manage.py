@@ -5,6 +5,8 @@ import sys
 
 
 def main():
+    if "test" in sys.argv:
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings_test")
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
     try:
         from django.core.management import execute_from_command_line
@@ -15,29 +17,6 @@ def main():
             "forget to activate a virtual environment?"
         ) from exc
 
-    from django.conf import settings
-
-    if "test" in sys.argv:
-        import logging
-
-        logging.disable(logging.CRITICAL)
-        settings.DEBUG = False
-        settings.TEMPLATE_DEBUG = False
-        settings.PASSWORD_HASHERS = [
-            "django.contrib.auth.hashers.MD5PasswordHasher",
-        ]
-        settings.DATABASES = {
-            "default": {
-                "ENGINE": "django.db.backends.sqlite3",
-                "NAME": "test_database",
-            }
-        }
-        settings.MIDDLEWARE_CLASSES = [
-            "django.contrib.sessions.middleware.SessionMiddleware",
-            "django.middleware.csrf.CsrfViewMiddleware",
-            "django.contrib.auth.middleware.AuthenticationMiddleware",
-            "django.contrib.messages.middleware.MessageMiddleware",
-        ]
     execute_from_command_line(sys.argv)
 
 
@@ -2,6 +2,9 @@
 ASGI config for project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+This is what the web process serves (see Procfile), so it defaults to the
+production settings; run it with DJANGO_SETTINGS_MODULE=project.settings in
+development.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
@@ -11,6 +14,16 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings_production')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, as it uses the ORM.
+from circle.events import event_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == '/events/':
+        await event_stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
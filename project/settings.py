@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 import environ
@@ -65,6 +66,9 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "circle.replicas.ReplicaStickinessMiddleware",
+    "circle.slowlog.SlowQueryMiddleware",
+    "circle.profiling.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -93,6 +97,23 @@ WSGI_APPLICATION = "project.wsgi.application"
 
 DATABASES = {"default": env.db()}
 
+# Read replicas, as a comma-separated list of database URLs (see circle/replicas.py)
+DATABASE_REPLICAS = []
+for index, url in enumerate(env.list("REPLICA_DATABASE_URLS", default=[])):
+    alias = f"replica_{index}"
+    DATABASES[alias] = env.db_url_config(url)
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["circle.replicas.ReplicaRouter"]
+
+# Seconds to keep reading from the primary after a client writes
+REPLICA_STICKY_SECONDS = env.int("REPLICA_STICKY_SECONDS", default=10)
+# Replicas further behind than this many seconds are not read from
+REPLICA_MAX_LAG = env.float("REPLICA_MAX_LAG", default=5.0)
+# Seconds between replica health checks, made in the background by each process
+REPLICA_HEALTH_CHECK_INTERVAL = env.float("REPLICA_HEALTH_CHECK_INTERVAL", default=5.0)
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -134,6 +155,17 @@ STATICFILES_DIRS = [
 
 MEDIA_URL = "/media/"
 MEDIA_DIR = BASE_DIR / "media"
+# Data exports and post archives, which are never served as media (see
+# circle/storage.py)
+PRIVATE_MEDIA_ROOT = env("PRIVATE_MEDIA_ROOT", default=str(BASE_DIR / "private_media"))
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "private": {"BACKEND": "circle.storage.PrivateFileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+    },
+}
 
 # Custom user model
 
@@ -155,16 +187,44 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_THROTTLE_CLASSES": [
+        "circle.throttling.TokenBucketThrottle",
+    ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 5,
 }
 
+# Kept in the database by default, so that every worker on every machine sees
+# the same entries and invalidations. Point CACHE_URL at e.g. Redis or Memcached
+# to take it off the database. The table is created by migration 0017.
+CACHES = {"default": env.cache("CACHE_URL", default="dbcache://django_cache")}
+
+# How long each user's /directory/ is cached (see circle/directory.py)
+DIRECTORY_CACHE_SECONDS = env.int("DIRECTORY_CACHE_SECONDS", default=600)
+
+# Rows serialized at a time by ?stream=true list responses
+STREAM_CHUNK_SIZE = 500
+
+# Posts in each zip file of a data export (see circle/exports.py)
+EXPORT_POSTS_PER_PART = 1000
+
+# Rows deleted per statement when purging deleted circles and users
+PURGE_BATCH_SIZE = 1000
+
+# The most posts that can be created with a single POST /posts/batch/
+MAX_BATCH_POSTS = 100
+
+# The most people that can be invited with a single POST /invitations/
+MAX_BULK_INVITATIONS = 500
+
 CORS_ALLOW_ALL_ORIGINS = True
 from corsheaders.defaults import default_headers
 
 CORS_ALLOW_HEADERS = list(default_headers) + [
     "content-disposition",
+    "x-profile",
 ]
+CORS_EXPOSE_HEADERS = ["x-profile-id"]
 
 # Amazon S3 settings
 if env("USE_S3"):
@@ -177,7 +237,76 @@ if env("USE_S3"):
     }
     AWS_S3_FILE_OVERWRITE = False
     AWS_DEFAULT_ACL = "public-read"
-    DEFAULT_FILE_STORAGE = "storages.backends.s3boto3.S3Boto3Storage"
+    STORAGES["default"] = {"BACKEND": "storages.backends.s3boto3.S3Boto3Storage"}
+    STORAGES["private"] = {
+        "BACKEND": "storages.backends.s3boto3.S3Boto3Storage",
+        "OPTIONS": {
+            "location": "private",
+            "default_acl": "private",
+            "querystring_auth": True,
+            # Links through the custom domain would not be signed.
+            "custom_domain": None,
+        },
+    }
+
+
+# Background jobs (see circle/jobs.py and ./manage.py runworker)
+
+JOB_WORKERS = env.int("JOB_WORKERS", default=4)
+JOB_WORKER_MODE = env("JOB_WORKER_MODE", default="thread")
+JOB_POLL_INTERVAL = env.float("JOB_POLL_INTERVAL", default=1.0)
+JOB_MAX_ATTEMPTS = env.int("JOB_MAX_ATTEMPTS", default=5)
+JOB_RETRY_BACKOFF = env.float("JOB_RETRY_BACKOFF", default=10.0)
+JOB_RETRY_MAX_DELAY = env.float("JOB_RETRY_MAX_DELAY", default=3600.0)
+JOB_LOCK_TIMEOUT = env.int("JOB_LOCK_TIMEOUT", default=1800)
+JOB_HEARTBEAT_INTERVAL = env.float("JOB_HEARTBEAT_INTERVAL", default=60.0)
+
+# Server-sent events at /events/ on the ASGI app (see circle/events.py)
+
+EVENTS_BROKER = env("EVENTS_BROKER", default="circle.events.InProcessBroker")
+EVENTS_HEARTBEAT = env.float("EVENTS_HEARTBEAT", default=15.0)
+EVENTS_QUEUE_SIZE = env.int("EVENTS_QUEUE_SIZE", default=100)
+
+# Slow query log (see circle/slowlog.py and /slow-queries/)
+
+SLOW_QUERY_THRESHOLD_MS = env.float("SLOW_QUERY_THRESHOLD_MS", default=200.0)
+SLOW_QUERY_EXPLAIN = env.bool("SLOW_QUERY_EXPLAIN", default=True)
+# Fraction of slow SELECTs re-run with EXPLAIN ANALYZE (PostgreSQL only)
+SLOW_QUERY_ANALYZE_SAMPLE_RATE = env.float(
+    "SLOW_QUERY_ANALYZE_SAMPLE_RATE", default=0.01
+)
+SLOW_QUERY_LOG_FILE = env(
+    "SLOW_QUERY_LOG_FILE", default=str(BASE_DIR / "slow_queries.log")
+)
+# Every web and worker process appends to the log, so it can't rotate itself.
+# Rotate it from outside instead, e.g. with logrotate's `rotate 5` and no
+# compression; the handler reopens the file when it is moved. The slow query
+# report reads this many rotated files (.1, .2, ...) as well.
+SLOW_QUERY_LOG_BACKUPS = env.int("SLOW_QUERY_LOG_BACKUPS", default=5)
+
+# Profiles of requests sent with X-Profile by staff (see circle/profiling.py)
+
+PROFILE_DIR = env("PROFILE_DIR", default=str(BASE_DIR / "profiles"))
+# Seconds between stack samples with X-Profile: sample
+PROFILE_SAMPLE_INTERVAL = env.float("PROFILE_SAMPLE_INTERVAL", default=0.005)
+
+# Posts older than this many days are left out of the feed (see /posts/history/)
+# and moved to cold storage by ./manage.py archive_posts (see circle/archive.py)
+POST_HOT_DAYS = env.int("POST_HOT_DAYS", default=365)
+
+# Token bucket rate limits (see circle/throttling.py). Each scope allows `burst`
+# requests at once and then `rate` on average.
+
+THROTTLE_DB = env(
+    "THROTTLE_DB", default=os.path.join(tempfile.gettempdir(), "circle-throttle.db")
+)
+THROTTLE_RATES = {
+    "default": {"rate": "600/min", "burst": 120},
+    "feed": {"rate": "120/min", "burst": 30},
+    "post_create": {"rate": "60/min", "burst": 20},
+    "invite": {"rate": "30/min", "burst": 10},
+    "export": {"rate": "10/hour", "burst": 3},
+}
 
 
 # Configure Django App for Heroku.
@@ -185,3 +314,16 @@ import django_heroku
 
 django_heroku.settings(locals())
 del DATABASES["default"]["OPTIONS"]["sslmode"]
+
+LOGGING["formatters"]["message"] = {"format": "%(message)s"}
+LOGGING["handlers"]["slow_queries"] = {
+    "class": "logging.handlers.WatchedFileHandler",
+    "filename": SLOW_QUERY_LOG_FILE,
+    "delay": True,
+    "formatter": "message",
+}
+LOGGING["loggers"]["circle.slowlog"] = {
+    "handlers": ["slow_queries"],
+    "level": "WARNING",
+    "propagate": False,
+}
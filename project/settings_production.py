@@ -0,0 +1,38 @@
+"""
+Production settings, used by gunicorn (see gunicorn.conf.py) and project/asgi.py.
+
+These build on the development settings in `project.settings`, drop the
+development-only apps, and keep database connections open between requests.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, INSTALLED_APPS, MIDDLEWARE, env
+
+DEBUG = env("DEBUG")
+
+# Development tools are never imported in production.
+DEVELOPMENT_APPS = ["debug_toolbar", "django_extensions"]
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in DEVELOPMENT_APPS]
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE if not middleware.startswith("debug_toolbar.")
+]
+
+# The storages app is only needed when files are kept on S3, and loading it
+# pulls in boto3.
+if not env("USE_S3"):
+    INSTALLED_APPS.remove("storages")
+
+# Persistent connections: each worker keeps its connection open for up to
+# CONN_MAX_AGE seconds, and checks it is still usable before reusing it after
+# an error. Put PgBouncer in front of the database to pool connections across
+# workers and dynos.
+for database in DATABASES.values():
+    database["CONN_MAX_AGE"] = env.int("CONN_MAX_AGE", default=600)
+    database["CONN_HEALTH_CHECKS"] = True
+    database.setdefault("OPTIONS", {})
+    if database["ENGINE"] == "django.db.backends.postgresql":
+        database["OPTIONS"].setdefault("connect_timeout", 5)
+
+# Posts are written in one web process and streamed from another, so events go
+# through the database rather than staying in the process (see circle/events.py).
+if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    EVENTS_BROKER = env("EVENTS_BROKER", default="circle.events.PostgresBroker")
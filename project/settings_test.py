@@ -0,0 +1,41 @@
+"""
+Test settings, used by `./manage.py test`.
+
+These build on the development settings in `project.settings` with a fast
+password hasher, in-memory SQLite databases and logging turned off. Being a
+settings module rather than changes made in manage.py, they also apply in the
+worker processes of `./manage.py test --parallel`, which gives each worker its
+own copy of the test databases.
+"""
+import logging
+
+from .settings import *  # noqa: F401,F403
+
+logging.disable(logging.CRITICAL)
+
+DEBUG = False
+TEMPLATE_DEBUG = False
+
+# Test users don't need a slow hash. Factories hash each password only once too.
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": "test_database",
+    },
+    # A separate database, not a mirror, so that replica tests can see reads go
+    # to a copy that lags behind. It is only created for tests that ask for it,
+    # and only used as a replica where a test sets DATABASE_REPLICAS.
+    "replica_0": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": "test_replica",
+    },
+}
+DATABASE_REPLICAS = []
+
+# Tests of throttling set their own rates.
+THROTTLE_RATES = {}
+
+# Query counts in tests are about the app's own queries, not the cache table's.
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
@@ -26,16 +26,26 @@ api_router.register("posts", circle_views.PostViewSet, basename="post")
 api_router.register(
     "invitations", circle_views.CircleInvitationViewSet, basename="circleinvitation"
 )
+api_router.register("directory", circle_views.DirectoryViewSet, basename="directory")
+api_router.register("exports", circle_views.DataExportViewSet, basename="dataexport")
+api_router.register(
+    "slow-queries", circle_views.SlowQueryViewSet, basename="slowquery"
+)
+api_router.register("profiles", circle_views.ProfileViewSet, basename="profile")
+
+# Djoser's user routes, with account deletion handled by a background purge.
+auth_router = DefaultRouter()
+auth_router.register("users", circle_views.UserViewSet)
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api-auth/", include("rest_framework.urls")),
-    path("auth/", include("djoser.urls")),
+    path("auth/", include(auth_router.urls)),
     path("auth/", include("djoser.urls.authtoken")),
     path("", include(api_router.urls)),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
-if settings.DEBUG:
+if settings.DEBUG and "debug_toolbar" in settings.INSTALLED_APPS:
     import debug_toolbar
 
     urlpatterns = [
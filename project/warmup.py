@@ -0,0 +1,51 @@
+"""
+Work that makes the first requests to a fresh worker as fast as later ones.
+
+gunicorn preloads the app and calls `warm_up` once in the master process before
+forking, so every worker starts with URL patterns resolved and serializers and
+their models introspected. Each worker then calls `warm_up_connections` to open
+its own database connections before it accepts traffic.
+"""
+from django.db import connections
+from django.urls import get_resolver
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APIRequestFactory
+
+from circle import serializers as circle_serializers
+
+
+def warm_up_urls():
+    resolver = get_resolver()
+    # Touching these populates the resolver's lookup tables.
+    resolver.reverse_dict
+    resolver.namespace_dict
+    return len(resolver.url_patterns)
+
+
+def warm_up_serializers():
+    request = APIRequestFactory().get("/")
+    serializer_classes = [
+        value
+        for value in vars(circle_serializers).values()
+        if isinstance(value, type)
+        and issubclass(value, BaseSerializer)
+        and value.__module__ == circle_serializers.__name__
+    ]
+    for serializer_class in serializer_classes:
+        # Building the fields introspects the model and its relations.
+        serializer_class(context={"request": request}).fields
+    return len(serializer_classes)
+
+
+def warm_up_connections():
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+def warm_up():
+    warm_up_urls()
+    warm_up_serializers()
+    # Check the databases are reachable, but don't leave connections open in a
+    # process that is about to fork.
+    warm_up_connections()
+    connections.close_all()